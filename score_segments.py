@@ -0,0 +1,30 @@
+import argparse
+
+import pandas as pd
+
+from src.analysis.segmentation import assign_segments
+from src.analysis.segmentation_model import read_segmentation_model, segmentation_model_file_name
+from src.logger import logger
+from src.settings import Settings
+
+
+if __name__ == "__main__":
+    # This is entrypoint for batch jobs to assign segments to RFM statistics with the models prepared on deployment.
+    parser = argparse.ArgumentParser(description="Assigns customer segments to RFM statistics from a CSV file.")
+    parser.add_argument("input_csv", help="CSV file with Customer ID, Recency, Frequency and Monetary columns")
+    parser.add_argument("output_csv", help="CSV file to write the statistics with Segment ID column to")
+    parser.add_argument("--segments", type=int, default=4, help="Number of segments of the model. Default is 4.")
+    parser.add_argument(
+        "--chunksize", type=int, default=1_000_000, help="Number of rows to score at once. Default is 1000000."
+    )
+    args = parser.parse_args()
+
+    model = read_segmentation_model(segmentation_model_file_name(Settings.prepared_data_path, args.segments))
+
+    rows_count = 0
+    for index, chunk in enumerate(pd.read_csv(args.input_csv, chunksize=args.chunksize)):
+        chunk["Segment ID"] = assign_segments(model, chunk)
+        chunk.to_csv(args.output_csv, mode="w" if index == 0 else "a", header=index == 0, index=False)
+        rows_count += len(chunk)
+
+    logger.info(f"Assigned {args.segments} segments to {rows_count} rows of {args.input_csv} into {args.output_csv}")
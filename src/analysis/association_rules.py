@@ -0,0 +1,155 @@
+from apyori import apriori
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.settings import Settings
+
+# The number of set bits in each byte value, to count transactions in bitsets
+_bits_count_by_byte = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+
+def encode_baskets(transactions):
+    """Encodes the lists of items in transactions as the baskets matrix the association rules are found in.
+
+    Parameters:
+        transactions (list): The lists of items in each transaction.
+
+    Returns:
+        tuple: A tuple containing the CSR matrix counting each item (column) in each transaction (row),
+        and the sorted items of its columns.
+    """
+
+    items, item_ids = np.unique([item for transaction in transactions for item in transaction], return_inverse=True)
+    transaction_ids = np.repeat(np.arange(len(transactions)), [len(transaction) for transaction in transactions])
+    baskets = csr_matrix(
+        (np.ones(len(item_ids), dtype=np.int64), (transaction_ids, item_ids)), shape=(len(transactions), len(items))
+    )
+    return baskets, items
+
+
+def association_rules(baskets, items, min_support, min_confidence, min_lift, engine=Settings.association_rules_engine):
+    """Finds association rules with one item in the antecedent between items bought together.
+
+    For each frequent set of items, the rule with the most confident antecedent is taken among those
+    having enough confidence and lift. Of equally confident antecedents, the first in sorted order is taken.
+
+    Parameters:
+        baskets (scipy.sparse.csr_matrix): The counts of each item (column) in each transaction (row).
+        items (numpy.ndarray): The sorted items of the columns.
+        min_support (float): The minimal share of transactions including all items of the rule.
+        min_confidence (float): The minimal share of transactions with the antecedent including the consequent.
+        min_lift (float): The minimal ratio of the rule's support to the support expected for independent items.
+        engine (str, optional): The name of the engine to find frequent sets of items with,
+            see frequent_itemsets. Default is Settings.association_rules_engine.
+
+    Returns:
+        list: The rules as tuples of antecedent item, consequent items sorted in a tuple, support, confidence,
+        and lift.
+    """
+
+    supports = frequent_itemsets(baskets, items, min_support, engine)
+
+    rules = []
+    for items, support in supports.items():
+        if len(items) < 2:
+            continue
+
+        rule = None
+        for antecedent in items:
+            consequent = tuple(item for item in items if item != antecedent)
+            confidence = support / supports[(antecedent,)]
+            lift = confidence / supports[consequent]
+            if confidence >= min_confidence and lift >= min_lift and (rule is None or confidence > rule[3]):
+                rule = (antecedent, consequent, support, confidence, lift)
+
+        if rule is not None:
+            rules.append(rule)
+
+    return rules
+
+
+def frequent_itemsets(baskets, items, min_support, engine=Settings.association_rules_engine):
+    """Finds sets of items bought together in at least min_support share of transactions.
+
+    Parameters:
+        baskets (scipy.sparse.csr_matrix): The counts of each item (column) in each transaction (row).
+        items (numpy.ndarray): The sorted items of the columns.
+        min_support (float): The minimal share of transactions including all items of the set.
+        engine (str, optional): "eclat" to intersect bitsets of transactions with numpy,
+            or "apriori" to count candidate sets with apyori, that is orders of magnitude slower.
+            Default is Settings.association_rules_engine.
+
+    Returns:
+        dict: The support of each frequent set of items, by the sorted tuple of its items.
+    """
+
+    return _engines[engine](baskets.tocsr(), items, min_support)
+
+
+def transaction_ids_by_item(baskets, items):
+    """Builds the inverted index of transactions, to find the transactions including a set of items
+    by intersecting their transaction ids instead of scanning all transactions.
+
+    Parameters:
+        baskets (scipy.sparse.csr_matrix): The counts of each item (column) in each transaction (row).
+        items (numpy.ndarray): The items of the columns.
+
+    Returns:
+        dict: The sorted numpy array of distinct positions of transactions including each item, by the item.
+    """
+
+    # the compressed columns are the transactions of each item
+    by_item = baskets.tocsc()
+    by_item.sum_duplicates()
+
+    return dict(zip(items.tolist(), np.split(by_item.indices, by_item.indptr[1:-1])))
+
+
+def _eclat_itemsets(baskets, items, min_support):
+    transactions_count = baskets.shape[0]
+    items = items.tolist()
+
+    # bitsets of transactions including each item, one bit per transaction
+    transaction_ids = np.repeat(np.arange(transactions_count), np.diff(baskets.indptr))
+    bitsets = np.zeros((len(items), (transactions_count + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(bitsets, (baskets.indices, transaction_ids >> 3), (128 >> (transaction_ids & 7)).astype(np.uint8))
+
+    supports = {}
+
+    def extend(prefix, candidate_ids, candidate_bitsets):
+        # all candidates extending the prefix are counted at once
+        counts = _bits_count_by_byte[candidate_bitsets].sum(axis=1)
+        is_frequent = counts / transactions_count >= min_support
+        candidate_ids, candidate_bitsets, counts = (
+            candidate_ids[is_frequent],
+            candidate_bitsets[is_frequent],
+            counts[is_frequent],
+        )
+
+        for position, item_id in enumerate(candidate_ids.tolist()):
+            itemset = (*prefix, items[item_id])
+            supports[itemset] = int(counts[position]) / transactions_count
+
+            # the following items keep the itemset sorted
+            if position + 1 < len(candidate_ids):
+                extend(
+                    itemset,
+                    candidate_ids[position + 1 :],
+                    candidate_bitsets[position + 1 :] & candidate_bitsets[position],
+                )
+
+    extend((), np.arange(len(items)), bitsets)
+
+    return supports
+
+
+def _apriori_itemsets(baskets, items, min_support):
+    transactions = [
+        items[baskets.indices[start:stop]].tolist() for start, stop in zip(baskets.indptr, baskets.indptr[1:])
+    ]
+    # with zero confidence and lift apyori yields every frequent itemset
+    relations = apriori(transactions, min_support=min_support, min_confidence=0, min_lift=0)
+    return {tuple(sorted(relation.items)): relation.support for relation in relations}
+
+
+_engines = {"eclat": _eclat_itemsets, "apriori": _apriori_itemsets}
@@ -1,5 +1,23 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
-from deps.kmeans_feature_importance.kmeans_feature_imp import KMeansInterp
+from threadpoolctl import threadpool_limits
+
+from src.logger import logger
+from src.settings import Settings
+
+# Centroids of the last fit in the units of the data, by the warm start key and the number of clusters,
+# the least recently fitted are forgotten beyond Settings.k_means_warm_starts_max_entries
+_warm_start_centroids = OrderedDict()
+_warm_start_centroids_lock = threading.Lock()
 
 
 def rfm_scores(df):
@@ -19,43 +37,337 @@ def rfm_scores(df):
 
     snapshot_date = df["Invoice Date"].max()
 
+    # named aggregations run as vectorized group reductions, without calling Python code per customer
     rfm = (
         df.groupby("Customer ID", observed=True)
         .agg(
-            {
-                "Invoice Date": lambda dates: (snapshot_date - dates.max()).days,
-                "Invoice ID": lambda invoice_ids: invoice_ids.nunique(),
-                "Total Cost": lambda total_cost: total_cost.sum(),
-            }
+            Recency=("Invoice Date", "max"),
+            Frequency=("Invoice ID", "nunique"),
+            Monetary=("Total Cost", "sum"),
         )
         .reset_index()
     )
-    rfm.rename(columns={"Invoice Date": "Recency", "Invoice ID": "Frequency", "Total Cost": "Monetary"}, inplace=True)
-    rfm["Recency"] = rfm["Recency"].astype(int)
+    rfm["Recency"] = (snapshot_date - rfm["Recency"]).dt.days.astype(int)
 
     return rfm
 
 
-def k_means_centroids(df, n_clusters):
+def rfm_prefix_aggregates(df):
+    """Precomputes per customer and country running totals by day, to calculate RFM statistics
+    for any date range and countries with range queries instead of scanning transactions.
+
+    Days are split into the midnight and the rest of the day, because the date range filter
+    includes the midnight of the last selected date. An invoice is expected to have a single date.
+
+    Parameters:
+        df (pandas.DataFrame): The prepared DataFrame.
+
+    Returns:
+        dict: The aggregates of day cells sorted by Customer ID, Country, and day,
+        to be passed to rfm_scores_within.
+    """
+
+    dates = df["Invoice Date"]
+    days = dates.dt.floor("D")
+    cells = pd.DataFrame(
+        {
+            "Customer ID": df["Customer ID"],
+            "Country": df["Country"].astype("int64"),
+            # two cells a day, the midnight one goes first
+            "Cell": _day_cells(days.to_numpy()) + (dates != days).to_numpy(),
+            "Invoice ID": df["Invoice ID"],
+            "Invoice Date": dates,
+            "Total Cost": df["Total Cost"],
+        }
+    )
+    cells = (
+        cells.groupby(["Customer ID", "Country", "Cell"], observed=True, sort=True)
+        .agg(
+            Last=("Invoice Date", "max"),
+            Invoices=("Invoice ID", "nunique"),
+            Spend=("Total Cost", "sum"),
+        )
+        .reset_index()
+    )
+
+    customers = cells["Customer ID"].to_numpy()
+    countries = cells["Country"].to_numpy()
+    is_segment_start = np.r_[True, (customers[1:] != customers[:-1]) | (countries[1:] != countries[:-1])]
+    segment_starts = np.flatnonzero(is_segment_start)
+    segments = np.cumsum(is_segment_start) - 1
+
+    cell_keys = cells["Cell"].to_numpy()
+    keys_base = int(cell_keys.max()) + 1 if len(cell_keys) else 1
+
+    return {
+        "segment_customers": customers[segment_starts],
+        "segment_countries": countries[segment_starts],
+        "segment_starts": segment_starts,
+        "segment_ends": np.r_[segment_starts[1:], len(cells)].astype(segment_starts.dtype),
+        # cells are sorted by these keys, so cells of a segment within dates are found with binary search
+        "keys": segments * keys_base + cell_keys,
+        "keys_base": keys_base,
+        "last_dates": cells["Last"].to_numpy(),
+        "cumulative_invoices": np.r_[0, np.cumsum(cells["Invoices"].to_numpy())],
+        "cumulative_spend": np.r_[0.0, np.cumsum(cells["Spend"].to_numpy())],
+    }
+
+
+def rfm_scores_within(aggregates, dates=None, country_code=None, reject_country_code=None):
+    """Calculates the RFM statistics of transactions within the dates and countries from the prefix aggregates.
+
+    The result is the same as of rfm_scores for the filtered transactions,
+    up to the floating point rounding of Monetary.
+
+    Parameters:
+        aggregates (dict): The aggregates returned by rfm_prefix_aggregates.
+        dates (tuple, optional): The date range as selected in the sidebar, or None for all dates.
+        country_code (int, optional): The code of the country to keep, or None for all countries.
+        reject_country_code (int, optional): The code of the country to reject, if any.
+
+    Returns:
+        pandas.DataFrame: The RFM statistics table.
+    """
+
+    customers = aggregates["segment_customers"]
+    countries = aggregates["segment_countries"]
+    starts, ends = aggregates["segment_starts"], aggregates["segment_ends"]
+
+    if dates:
+        # cells from the first date's midnight to the last date's midnight,
+        # the bounds are clipped to not reach cells of the neighbour segments
+        keys_base = aggregates["keys_base"]
+        first_cell = np.clip(_day_cells(pd.to_datetime(dates[0]).to_datetime64()), -1, keys_base)
+        last_cell = np.clip(_day_cells(pd.to_datetime(dates[1]).to_datetime64()), -1, keys_base)
+        segments_base = np.arange(len(starts)) * keys_base
+        starts = aggregates["keys"].searchsorted(segments_base + first_cell, side="left")
+        ends = aggregates["keys"].searchsorted(segments_base + last_cell, side="right")
+
+    is_selected = ends > starts
+    if country_code:
+        is_selected &= countries == country_code
+    if reject_country_code:
+        is_selected &= countries != reject_country_code
+
+    starts, ends = starts[is_selected], ends[is_selected]
+    segments = pd.DataFrame(
+        {
+            "Customer ID": customers[is_selected],
+            "Recency": aggregates["last_dates"][ends - 1],
+            "Frequency": aggregates["cumulative_invoices"][ends] - aggregates["cumulative_invoices"][starts],
+            "Monetary": aggregates["cumulative_spend"][ends] - aggregates["cumulative_spend"][starts],
+        }
+    )
+
+    # a customer may buy in several countries
+    rfm = (
+        segments.groupby("Customer ID")
+        .agg(Recency=("Recency", "max"), Frequency=("Frequency", "sum"), Monetary=("Monetary", "sum"))
+        .reset_index()
+    )
+    rfm["Recency"] = (rfm["Recency"].max() - rfm["Recency"]).dt.days.astype(int)
+
+    return rfm
+
+
+def _day_cells(dates):
+    return dates.astype("datetime64[D]").astype("int64") * 2
+
+
+def k_means_centroids(
+    df,
+    n_clusters,
+    exact_max_samples=Settings.k_means_exact_max_samples,
+    sample_size=Settings.k_means_sample_size,
+):
     df = df.copy()
     X = StandardScaler().fit_transform(df)
 
-    kms = KMeansInterp(
+    kms, labels, _inertia = _fit_k_means(X, n_clusters, exact_max_samples, sample_size, None)
+
+    return _labeled_segments(df, kms, labels)
+
+
+def k_means_segmentations(
+    df,
+    n_clusters_options,
+    silhouette_sample_size=2_000,
+    exact_max_samples=Settings.k_means_exact_max_samples,
+    sample_size=Settings.k_means_sample_size,
+    warm_start_key=None,
+):
+    """Segments the data with K-Means for each of the given numbers of clusters at once,
+    fitting them in parallel on the same standardized data.
+
+    Parameters:
+        df (pandas.DataFrame): The data to segment, like RFM statistics.
+        n_clusters_options (list): The numbers of clusters to fit.
+        silhouette_sample_size (int, optional): The number of samples to estimate the silhouette score on,
+            instead of calculating it over all pairs of samples. Default is 2,000.
+        exact_max_samples (int, optional): The number of samples up to which K-Means is fitted on all of them.
+            More samples are segmented by K-Means fitted on a random sample of them in float32,
+            assigning every sample to the nearest centroid.
+        sample_size (int, optional): The number of samples to fit K-Means on when there are more than
+            exact_max_samples of them.
+        warm_start_key (str, optional): The key of the data selection, like the dataset version and
+            the country filter. Each fit starts from the centroids of the last fit in this process with the same key
+            and number of clusters, if any, that takes fewer iterations on similar data and keeps the numbering
+            of segments. Warm started segments depend on the fits made before, so they can differ from
+            the segments fitted from scratch, and between processes. Default is None, to fit from scratch.
+
+    Returns:
+        dict: A dictionary mapping each number of clusters to a dictionary with the "segments" DataFrame
+        labeled with Segment ID, the "features_importance" by segment,
+        the "inertia" of the clustering, its approximate "silhouette" score,
+        and the "model" to assign segments to other data with assign_segments.
+    """
+
+    scaler = StandardScaler().fit(df)
+    X = scaler.transform(df)
+    feature_names = df.columns.tolist()
+
+    # KMeans runs OpenMP threads on every core, so the cores are split between the parallel fits
+    workers = min(len(n_clusters_options), os.cpu_count() or 1)
+    threads_per_fit = max(1, (os.cpu_count() or 1) // workers)
+
+    def fit(n_clusters):
+        init_centroids = None
+        with _warm_start_centroids_lock:
+            previous_centroids = _warm_start_centroids.get((warm_start_key, n_clusters))
+        if warm_start_key is not None and previous_centroids is not None:
+            # centroids are kept in the units of the data, as they are scaled differently for each selection
+            init_centroids = (previous_centroids - scaler.mean_) / scaler.scale_
+
+        # the OpenMP threads limit applies to the calling thread only
+        with threadpool_limits(limits=threads_per_fit, user_api="openmp"):
+            kms, labels, inertia = _fit_k_means(X, n_clusters, exact_max_samples, sample_size, init_centroids)
+
+        if warm_start_key is not None:
+            _remember_warm_start(warm_start_key, n_clusters, kms.cluster_centers_ * scaler.scale_ + scaler.mean_)
+
+        return kms, labels, inertia
+
+    # KMeans spends its time in compiled code releasing the GIL, so threads fit the clusterings in parallel
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fits = list(executor.map(fit, n_clusters_options))
+
+    segmentations = {}
+    for n_clusters, (kms, labels, inertia) in zip(n_clusters_options, fits):
+        segments, features_importance = _labeled_segments(df.copy(), kms, labels)
+        segmentations[n_clusters] = {
+            "segments": segments,
+            "features_importance": features_importance,
+            "inertia": inertia,
+            "silhouette": _sampled_silhouette_score(X, labels, silhouette_sample_size),
+            "model": {
+                "feature_names": feature_names,
+                "scaler_mean": scaler.mean_.tolist(),
+                "scaler_scale": scaler.scale_.tolist(),
+                "centroids": kms.cluster_centers_.tolist(),
+                "features_importance": {
+                    segment_id: [(feature, float(weight)) for feature, weight in importances]
+                    for segment_id, importances in features_importance.items()
+                },
+            },
+        }
+
+    return segmentations
+
+
+def assign_segments(model, df):
+    """Assigns segments to the data with the model fitted by k_means_segmentations, in a single vectorized pass.
+
+    Parameters:
+        model (dict): The model of the segmentation.
+        df (pandas.DataFrame): The data with the same columns as the model was fitted on, like RFM statistics.
+
+    Returns:
+        numpy.ndarray: The Segment ID of each row, starting from 1.
+    """
+
+    X = (df[model["feature_names"]].to_numpy(dtype=np.float64) - model["scaler_mean"]) / model["scaler_scale"]
+    labels, _distances = _nearest_centroids(X, np.asarray(model["centroids"]))
+
+    # make segments start from 1
+    return labels + 1
+
+
+def _remember_warm_start(warm_start_key, n_clusters, centroids):
+    with _warm_start_centroids_lock:
+        _warm_start_centroids[(warm_start_key, n_clusters)] = centroids
+        _warm_start_centroids.move_to_end((warm_start_key, n_clusters))
+        while len(_warm_start_centroids) > Settings.k_means_warm_starts_max_entries:
+            _warm_start_centroids.popitem(last=False)
+
+
+def _fit_k_means(X, n_clusters, exact_max_samples, sample_size, init_centroids):
+    kms = KMeans(
         n_clusters=n_clusters,
         random_state=42,
-        ordered_feature_names=df.columns.tolist(),
-        n_init="auto",
+        init="k-means++" if init_centroids is None else init_centroids,
+        n_init="auto" if init_centroids is None else 1,
         max_iter=1000,
-        feature_importance_method="wcss_min",
-    ).fit(X)
+    )
+    started_at = time.perf_counter()
+
+    if len(X) <= exact_max_samples:
+        kms.fit(X)
+        labels, inertia = kms.labels_, kms.inertia_
+    else:
+        # The seeded sample keeps segments stable between runs
+        X = X.astype(np.float32)
+        sample = np.random.default_rng(42).choice(len(X), size=min(sample_size, len(X)), replace=False)
+        kms.fit(X[np.sort(sample)])
+
+        labels, distances = _nearest_centroids(X, kms.cluster_centers_)
+        inertia = float(distances.sum())
+
+    logger.info(
+        f"Fitted K-Means of {n_clusters} clusters to {len(X)} samples in {kms.n_iter_} iterations, \
+{time.perf_counter() - started_at:.3f}s, warm started: {init_centroids is not None}"
+    )
+
+    return kms, labels, inertia
+
 
+def _nearest_centroids(X, centroids):
+    # squared distances to all centroids at once, as |x|^2 - 2 x.c + |c|^2
+    distances = (X * X).sum(axis=1)[:, np.newaxis] - 2 * X @ centroids.T + (centroids * centroids).sum(axis=1)
+    labels = distances.argmin(axis=1)
+    return labels, np.maximum(distances[np.arange(len(X)), labels], 0)
+
+
+def _labeled_segments(df, kms, labels):
+    feature_names = df.columns.to_numpy()
     # make segments start from 1
-    df["Segment ID"] = kms.labels_ + 1
-    feature_importances = {k + 1: v for k, v in kms.feature_importances_.items()}
+    df["Segment ID"] = labels + 1
+    feature_importances = _wcss_min_feature_importances(kms.cluster_centers_, feature_names)
 
     return df, feature_importances
 
 
+def _wcss_min_feature_importances(centroids, feature_names):
+    # Features with the largest absolute standardized centroid values minimize the within-cluster sum of squares
+    # the most, so they rank first for each segment. All segments are ranked at once.
+    weights = np.abs(centroids)
+    order = weights.argsort(axis=1)[:, ::-1]
+    ordered_weights = np.take_along_axis(weights, order, axis=1)
+    ordered_features = feature_names[order]
+
+    return {
+        segment_id: list(zip(features.tolist(), segment_weights))
+        for segment_id, (features, segment_weights) in enumerate(zip(ordered_features, ordered_weights), start=1)
+    }
+
+
+def _sampled_silhouette_score(X, labels, sample_size):
+    # the score is defined for 2 to n_samples - 1 distinct labels
+    if not 2 <= len(np.unique(labels)) <= len(X) - 1:
+        return np.nan
+
+    return silhouette_score(X, labels, sample_size=min(sample_size, len(X)), random_state=42)
+
+
 def summarize_segments(labeled_rfm):
     return (
         labeled_rfm.groupby("Segment ID", observed=True)
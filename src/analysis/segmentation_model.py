@@ -0,0 +1,58 @@
+import json
+import os
+
+from src.logger import logger
+
+
+def segmentation_model_file_name(path, n_clusters):
+    """Returns the name of the file persisting the segmentation model of the given number of clusters.
+
+    Parameters:
+        path (str): The directory with the prepared data.
+        n_clusters (int): The number of clusters of the model.
+
+    Returns:
+        str: The file name.
+    """
+
+    return os.path.join(path, f"segmentation_model_{n_clusters}.json")
+
+
+def write_segmentation_model(file_name, model):
+    """Persists the segmentation model on disk, replacing the previously persisted one.
+
+    Parameters:
+        file_name (str): The name of the file to write.
+        model (dict): The model returned by k_means_segmentations.
+    """
+
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+
+    # We write to a temporary file first, so concurrent readers never see a partially written file
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    with open(tmp_file_name, "w") as file:
+        json.dump(model, file)
+    os.replace(tmp_file_name, file_name)
+
+    logger.info(f"Persisted segmentation model of {len(model['centroids'])} segments to {file_name}")
+
+
+def read_segmentation_model(file_name):
+    """Reads the segmentation model persisted on disk.
+
+    Parameters:
+        file_name (str): The name of the file to read.
+
+    Returns:
+        dict: The model to assign segments with assign_segments.
+    """
+
+    with open(file_name) as file:
+        model = json.load(file)
+
+    # JSON keeps dictionary keys as strings
+    model["features_importance"] = {
+        int(segment_id): [tuple(importance) for importance in importances]
+        for segment_id, importances in model["features_importance"].items()
+    }
+    return model
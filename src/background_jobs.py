@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import streamlit as st
+
+from src.logger import logger
+from src.settings import Settings
+
+
+def submit_job(key, job_fun, resubmit_finished=False):
+    """Runs the job in a background thread once per key, sharing it across reruns and sessions.
+
+    Finished jobs are kept with their results, the least recently submitted of them are
+    forgotten beyond Settings.views_cache_max_entries jobs. Failed jobs are submitted again.
+
+    Parameters:
+        key (str): The key of the job and its parameters.
+        job_fun (function): A function without arguments doing the job, it must not call streamlit.
+        resubmit_finished (bool, optional): Whether to submit the job again when it's finished already,
+            like when its result is dropped from a cache meanwhile. Defaults to False.
+
+    Returns:
+        concurrent.futures.Future: The future of the job result.
+    """
+
+    jobs = _jobs()
+    with jobs["lock"]:
+        futures = jobs["futures"]
+        future = futures.get(key)
+        if future is not None and not (future.done() and (resubmit_finished or future.exception() is not None)):
+            futures.move_to_end(key)
+            return future
+
+        logger.info(f'Submitting background job for "{key}" key')
+        futures.pop(key, None)
+        future = futures[key] = jobs["executor"].submit(job_fun)
+
+        finished_keys = [key for key, future in futures.items() if future.done()]
+        for finished_key in finished_keys[: max(0, len(futures) - Settings.views_cache_max_entries)]:
+            del futures[finished_key]
+
+        return future
+
+
+@st.cache_resource
+def _jobs():
+    return {
+        "executor": ThreadPoolExecutor(
+            max_workers=Settings.background_jobs_workers, thread_name_prefix="background_job"
+        ),
+        "futures": OrderedDict(),
+        "lock": threading.Lock(),
+    }
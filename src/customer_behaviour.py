@@ -1,6 +1,8 @@
 import streamlit as st
 
-from src.dataframe.preprocess import do_prepare_dataframe
+from src.dataframe.prepared_cache import file_fingerprint, read_prepared_metadata
+from src.dataframe.preprocess import PREPROCESS_VERSION, do_prepare_dataframe
+from src.dataframe.views import versioned_dataset
 from src.logger import logger
 from src.settings import Settings
 from src.pages import customer_segmentation, data_exploration, home, market_basket_analysis
@@ -8,9 +10,16 @@ from src.pages import customer_segmentation, data_exploration, home, market_bask
 PAGES = [customer_segmentation, data_exploration, home, market_basket_analysis]
 
 
-@st.cache_data
+# The dataframe is shared by all sessions without hashing or copying it on each rerun,
+# and its version keys the cached views filtered from it
+@st.cache_resource
 def _prepare_dataframe():
-    return do_prepare_dataframe()
+    df, code_by_country = do_prepare_dataframe()
+    # the prepared dataset records the hash of the CSV file, so the file isn't read again to hash it
+    metadata = read_prepared_metadata(Settings.prepared_data_path)
+    source_sha256 = metadata["source"]["sha256"] if metadata else file_fingerprint(Settings.dataset_csv_path)
+    dataset_version = f"{PREPROCESS_VERSION}_{source_sha256[:16]}"
+    return versioned_dataset(df, dataset_version), code_by_country
 
 
 def customer_behaviour_app():
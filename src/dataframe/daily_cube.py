@@ -0,0 +1,101 @@
+import pandas as pd
+
+
+def build_daily_country_cube(df):
+    """Rolls up the dataset into cells by day and country, to answer per country statistics for any dates quickly.
+
+    Cells of rows at exactly midnight are kept apart from the rest of the day,
+    because the date range filter includes the midnight of the last selected date.
+
+    Parameters:
+        df (pandas.DataFrame): The prepared DataFrame.
+
+    Returns:
+        dict: The cube with "revenue" cells, having Total Cost summed by day and country,
+        and "customers" cells, having distinct Customer IDs by day and country. Cells are sorted by Day.
+    """
+
+    days = df["Invoice Date"].dt.floor("D")
+    cells = pd.DataFrame(
+        {
+            "Day": days,
+            "At Midnight": df["Invoice Date"] == days,
+            "Country": df["Country"].astype("int64"),
+            "Customer ID": df["Customer ID"],
+            "Total Cost": df["Total Cost"],
+        }
+    )
+    keys = ["Day", "At Midnight", "Country"]
+
+    revenue = cells.groupby(keys, sort=True)["Total Cost"].sum().reset_index()
+    customers = cells[[*keys, "Customer ID"]].drop_duplicates().sort_values(keys, kind="stable")
+
+    return {"revenue": revenue.reset_index(drop=True), "customers": customers.reset_index(drop=True)}
+
+
+def customers_by_country(cube, code_by_country, dates=None, country_code=None, reject_country_code=None):
+    """Counts distinct customers per country within the selected dates and countries.
+
+    Parameters:
+        cube (dict): The cube returned by build_daily_country_cube.
+        code_by_country (dict): A dictionary mapping countries to their corresponding codes.
+        dates (tuple, optional): The date range as selected in the sidebar, or None for all dates.
+        country_code (int, optional): The code of the selected country, or None for all countries.
+        reject_country_code (int, optional): The code of the rejected country, if any.
+
+    Returns:
+        pandas.DataFrame: The table with Country in "Country name (code)" format and Customers count columns.
+    """
+
+    cells = _selected_cells(cube["customers"], dates, country_code, reject_country_code)
+    customers = cells.groupby("Country")["Customer ID"].nunique()
+    return _decoded_countries(customers, code_by_country, "Customers count")
+
+
+def revenue_by_country(cube, code_by_country, dates=None, country_code=None, reject_country_code=None):
+    """Sums revenue per country within the selected dates and countries.
+
+    Parameters:
+        cube (dict): The cube returned by build_daily_country_cube.
+        code_by_country (dict): A dictionary mapping countries to their corresponding codes.
+        dates (tuple, optional): The date range as selected in the sidebar, or None for all dates.
+        country_code (int, optional): The code of the selected country, or None for all countries.
+        reject_country_code (int, optional): The code of the rejected country, if any.
+
+    Returns:
+        pandas.DataFrame: The table with Country in "Country name (code)" format and Revenue columns.
+    """
+
+    cells = _selected_cells(cube["revenue"], dates, country_code, reject_country_code)
+    revenue = cells.groupby("Country")["Total Cost"].sum()
+    return _decoded_countries(revenue, code_by_country, "Revenue")
+
+
+def _selected_cells(cells, dates, country_code, reject_country_code):
+    if dates:
+        # same bounds as the date range filter, from the first date's midnight to the last date's midnight
+        start, end = pd.to_datetime(dates[0]).to_datetime64(), pd.to_datetime(dates[1]).to_datetime64()
+        days = cells["Day"].to_numpy()
+        start_position = days.searchsorted(start, side="left")
+        end_position = days.searchsorted(end, side="left")
+        end_day_position = days.searchsorted(end, side="right")
+
+        end_day_cells = cells.iloc[end_position:end_day_position]
+        cells = pd.concat([cells.iloc[start_position:end_position], end_day_cells[end_day_cells["At Midnight"]]])
+
+    if country_code:
+        cells = cells[cells["Country"] == country_code]
+
+    if reject_country_code:
+        cells = cells[cells["Country"] != reject_country_code]
+
+    return cells
+
+
+def _decoded_countries(values_by_code, code_by_country, values_column):
+    # countries are ordered by code, as decode_countries orders them
+    country_by_code = {
+        code: f"{country} ({code})" for country, code in sorted(code_by_country.items(), key=lambda item: item[1])
+    }
+    countries = pd.Categorical(values_by_code.index.map(country_by_code), categories=list(country_by_code.values()))
+    return pd.DataFrame({"Country": countries, values_column: values_by_code.to_numpy()})
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src.logger import logger
+
+_file_name = "manifest.json"
+
+
+def country_fingerprints(df, code_by_country):
+    """Hashes the rows of each country, to find out whose data changed between deployments
+    regardless of modification times of files.
+
+    Parameters:
+        df (pandas.DataFrame): The prepared DataFrame.
+        code_by_country (dict): A dictionary mapping countries to their corresponding codes.
+
+    Returns:
+        dict: The hex digest of the rows of each country, by the country name.
+    """
+
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    countries = df["Country"].to_numpy(dtype="int64")
+
+    return {
+        country: hashlib.sha256(row_hashes[countries == code].tobytes()).hexdigest()
+        for country, code in code_by_country.items()
+    }
+
+
+def artifact_fingerprint(**inputs):
+    """Hashes everything a prepared artifact is calculated from,
+    like fingerprints of the data, parameters, and the version of the code.
+
+    Parameters:
+        **inputs: The JSON serializable inputs of the artifact.
+
+    Returns:
+        str: The hex digest of the inputs.
+    """
+
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def read_manifest(path):
+    """Reads the manifest of prepared artifacts.
+
+    Parameters:
+        path (str): The directory with the prepared data.
+
+    Returns:
+        dict: The fingerprint of the inputs of each artifact by its file name,
+        empty if there is no valid manifest.
+    """
+
+    file_name = os.path.join(path, _file_name)
+    if not os.path.isfile(file_name):
+        return {}
+
+    try:
+        with open(file_name) as file:
+            return json.load(file)
+    except ValueError as e:
+        logger.warning(f"Failed to read manifest from {file_name}: {e}")
+        return {}
+
+
+def write_manifest(path, manifest):
+    """Persists the manifest of prepared artifacts, replacing the previously persisted one.
+
+    Parameters:
+        path (str): The directory with the prepared data.
+        manifest (dict): The fingerprint of the inputs of each artifact by its file name.
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    # We write to a temporary file first, so concurrent readers never see a partially written file
+    file_name = os.path.join(path, _file_name)
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    with open(tmp_file_name, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_file_name, file_name)
+
+
+def is_up_to_date(manifest, file_name, fingerprint):
+    """Tells whether the artifact file exists and was calculated from the inputs with the given fingerprint.
+
+    Parameters:
+        manifest (dict): The manifest returned by read_manifest.
+        file_name (str): The name of the artifact file.
+        fingerprint (str): The fingerprint of the current inputs of the artifact.
+
+    Returns:
+        bool: True if the artifact doesn't need to be calculated again.
+    """
+
+    return manifest.get(os.path.basename(file_name)) == fingerprint and os.path.isfile(file_name)
+
+
+def record_artifact(manifest, file_name, fingerprint):
+    """Records the fingerprint of the inputs the artifact file was calculated from into the manifest."""
+
+    manifest[os.path.basename(file_name)] = fingerprint
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from src.logger import logger
+
+_file_name = "prepared_dataframe.arrow"
+_metadata_key = b"customer_behaviour"
+
+
+def file_fingerprint(path, size=None, block_size=1 << 20):
+    """Calculates the content hash of the given file.
+
+    Parameters:
+        path (str): The path to the file.
+        size (int, optional): The number of bytes from the beginning of the file to hash. Default is the whole file.
+        block_size (int, optional): The number of bytes to read at once. Default is 1 MiB.
+
+    Returns:
+        str: The hex digest of the SHA-256 hash of the file's content.
+    """
+
+    digest = hashlib.sha256()
+    remaining = size if size is not None else os.path.getsize(path)
+    with open(path, "rb") as file:
+        while remaining > 0 and (block := file.read(min(block_size, remaining))):
+            digest.update(block)
+            remaining -= len(block)
+
+    return digest.hexdigest()
+
+
+def read_prepared_metadata(cache_path):
+    """Reads the metadata of the prepared dataframe persisted on disk without loading the dataframe.
+
+    Parameters:
+        cache_path (str): The directory with the cached files.
+
+    Returns:
+        dict: The metadata persisted with the dataframe, or None if there is no valid cached file.
+    """
+
+    file_name = os.path.join(cache_path, _file_name)
+    if not os.path.isfile(file_name):
+        return None
+
+    try:
+        with pa.memory_map(file_name) as source:
+            return json.loads(pa.ipc.open_file(source).schema.metadata[_metadata_key])
+    except (pa.ArrowException, KeyError, ValueError) as e:
+        logger.warning(f"Failed to read prepared dataframe metadata from {file_name}: {e}")
+        return None
+
+
+def read_prepared_dataframe(cache_path):
+    """Reads the prepared dataframe persisted on disk.
+
+    Parameters:
+        cache_path (str): The directory with the cached files.
+
+    Returns:
+        tuple: A tuple containing the prepared DataFrame and the metadata persisted with it,
+        or None if there is no valid cached file.
+    """
+
+    file_name = os.path.join(cache_path, _file_name)
+    if not os.path.isfile(file_name):
+        return None
+
+    try:
+        table = feather.read_table(file_name)
+        metadata = json.loads(table.schema.metadata[_metadata_key])
+        # keep strings in Arrow memory, as they are in the prepared dataframe
+        df = table.to_pandas(types_mapper={pa.large_string(): pd.StringDtype("pyarrow")}.get)
+    except (pa.ArrowException, KeyError, ValueError) as e:
+        logger.warning(f"Failed to read prepared dataframe from {file_name}: {e}")
+        return None
+
+    logger.info(f"Loaded prepared dataframe of shape {df.shape} from {file_name}")
+    return df, metadata
+
+
+def write_prepared_dataframe(cache_path, df, metadata):
+    """Persists the prepared dataframe on disk, replacing the previously persisted one.
+
+    Parameters:
+        cache_path (str): The directory to store the cached files in.
+        df (pandas.DataFrame): The prepared DataFrame.
+        metadata (dict): The JSON serializable metadata to persist with the DataFrame.
+    """
+
+    os.makedirs(cache_path, exist_ok=True)
+
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata({**table.schema.metadata, _metadata_key: json.dumps(metadata)})
+
+    # Arrow IPC format keeps categorical columns as they are, unlike Parquet that decodes integer categories.
+    # We write to a temporary file first, so concurrent readers never see a partially written file
+    file_name = os.path.join(cache_path, _file_name)
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_file_name, compression="lz4")
+    os.replace(tmp_file_name, file_name)
+
+    logger.info(f"Persisted prepared dataframe of shape {df.shape} to {file_name}")
@@ -1,15 +1,275 @@
-import pandas as pd
+import io
+import os
 
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from src.dataframe.quantile_sketch import QuantileSketch
+from src.dataframe.prepared_cache import (
+    file_fingerprint,
+    read_prepared_dataframe,
+    read_prepared_metadata,
+    write_prepared_dataframe,
+)
+from src.logger import logger
 from src.settings import Settings
 
+# Increment when the preparation steps below change to invalidate the prepared dataframes cached on disk
+PREPROCESS_VERSION = 3
+
+# Types of the CSV columns to parse them once while reading. Identifiers mix numbers and letters
+# (e.g. "C489449" invoice), so they are read as categories of strings to get the same type through the whole file.
+_csv_dtypes = {
+    "Invoice": "category",
+    "StockCode": "category",
+    "Description": "string[pyarrow]",
+    "Quantity": "int32",
+    "Price": "float64",
+    # has missing values, becomes int32 after the rows without customer are dropped
+    "Customer ID": "float64",
+    "Country": "category",
+}
+_csv_date_format = "%Y-%m-%d %H:%M:%S"
+
+# Types of the prepared dataframe columns
+_column_types = {
+    "Invoice ID": "category",
+    "Stock Code": "category",
+    "Stock Description": "string[pyarrow]",
+    "Quantity": "int32",
+    "Invoice Date": "datetime64[ns]",
+    "Price": "float64",
+    "Customer ID": "int32",
+    "Country": "category",
+}
+
+
+def do_prepare_dataframe(
+    csv_path=Settings.dataset_csv_path,
+    cache_path=Settings.prepared_data_path,
+    chunksize=Settings.dataset_chunksize,
+    sketch_relative_accuracy=Settings.outliers_sketch_relative_accuracy,
+):
+    """Prepares the dataset for analysis.
+
+    The cleaned dataset is cached on disk. It's loaded from the cache while the source file is unchanged.
+    When rows were appended to the source file, only these rows are cleaned and merged into the cached dataset.
+
+    Parameters:
+        csv_path (str, optional): The path to the dataset CSV file.
+        cache_path (str, optional): The directory to cache the prepared dataset in. Pass None to disable caching.
+        chunksize (int, optional): The number of CSV rows to read and clean at once, to bound the memory usage.
+            Pass None to read the whole file at once. Both ways produce the same DataFrame.
+        sketch_relative_accuracy (float, optional): The relative error of quantiles of Total Cost
+            estimated with the sketch built while reading rows, to find outliers without another pass over the rows.
+            Pass None to calculate exact quantiles.
+
+    Returns:
+        tuple: A tuple containing the prepared DataFrame,
+        and a dictionary mapping countries to their corresponding codes.
+    """
+
+    if cache_path:
+        df, metadata = _cached_clean_dataframe(csv_path, cache_path, chunksize, sketch_relative_accuracy)
+        code_by_country = metadata["code_by_country"]
+        sketch = _total_cost_sketch(df, metadata, sketch_relative_accuracy)
+    else:
+        df, code_by_country, _rows_count, sketch = _clean_dataframe_from_csv(
+            csv_path, chunksize, sketch_relative_accuracy
+        )
+
+    # bounds of outliers depend on all rows, so we reject them after the cleaned dataset is complete
+    df = reject_outliers_by_iqr(df, "Total Cost", sketch=sketch)
+
+    _log_memory_usage(df)
+
+    return df, code_by_country
+
+
+def _cached_clean_dataframe(csv_path, cache_path, chunksize, sketch_relative_accuracy):
+    source_size = os.path.getsize(csv_path)
+    source_sha256 = file_fingerprint(csv_path)
+
+    metadata = read_prepared_metadata(cache_path)
+    if metadata and metadata["version"] == PREPROCESS_VERSION:
+        source = metadata["source"]
+
+        is_unchanged = source["sha256"] == source_sha256
+        is_appended = (
+            not is_unchanged
+            and source["size"] < source_size
+            and file_fingerprint(csv_path, size=source["size"]) == source["sha256"]
+        )
+        cached = (is_unchanged or is_appended) and read_prepared_dataframe(cache_path)
+
+        if cached and is_unchanged:
+            return cached
+
+        if cached and is_appended:
+            logger.info(f"Preparing {source_size - source['size']} bytes appended to {csv_path}")
+            df, metadata = _append_clean_rows(*cached, csv_path, source_size, chunksize, sketch_relative_accuracy)
+            metadata["source"] = {**metadata["source"], "size": source_size, "sha256": source_sha256}
+            write_prepared_dataframe(cache_path, df, metadata)
+            return df, metadata
+
+    df, code_by_country, rows_count, sketch = _clean_dataframe_from_csv(csv_path, chunksize, sketch_relative_accuracy)
+    metadata = {
+        "version": PREPROCESS_VERSION,
+        "source": {"size": source_size, "sha256": source_sha256, "rows_count": rows_count},
+        "code_by_country": code_by_country,
+        "total_cost_sketch": sketch.to_dict() if sketch else None,
+    }
+    write_prepared_dataframe(cache_path, df, metadata)
+
+    return df, metadata
+
+
+def _clean_dataframe_from_csv(csv_path, chunksize, sketch_relative_accuracy):
+    sketch = QuantileSketch(sketch_relative_accuracy) if sketch_relative_accuracy else None
 
-def do_prepare_dataframe(csv_path=Settings.dataset_csv_path):
     # Prepare the dataset
-    df = pd.read_csv(csv_path)
+    if chunksize:
+        df, rows_count = _read_clean_rows_by_chunks(csv_path, chunksize, sketch=sketch)
+    else:
+        df = _read_csv(csv_path)
+        rows_count = len(df)
+        df = _clean_rows(df)
+        df = df.drop_duplicates()
+        if sketch:
+            sketch.update(df["Total Cost"])
+
+    # categories read from the file include values of the rejected rows
+    for column in ["Invoice ID", "Stock Code"]:
+        categories = df[column].cat.remove_unused_categories().cat.categories
+        df[column] = df[column].cat.set_categories(categories.sort_values())
+
+    # we encode the countries to a numerical value to prevent correlation analysis crash
+    df, code_by_country = encode_countries(df)
+
+    df = cast_column_types(df)
+
+    # sort for time series analysis, stable sorting keeps the file order of the rows with the same date
+    df = df.sort_values("Invoice Date", kind="stable")
+
+    return df, code_by_country, rows_count, sketch
+
+
+def _append_clean_rows(df, metadata, csv_path, source_size, chunksize, sketch_relative_accuracy):
+    source = metadata["source"]
+    code_by_country = metadata["code_by_country"]
+
+    # appended rows can duplicate the already prepared ones
+    seen_hashes = _row_hashes(df, code_by_country)
+
+    with open(csv_path, "rb") as file:
+        names = pd.read_csv(file, nrows=0).columns.tolist()
+        file.seek(source["size"])
+        # the file can grow while we read it, so we take appended bytes up to the hashed size only
+        appended_bytes = io.BytesIO(file.read(source_size - source["size"]))
+
+    previous_sketch = _total_cost_sketch(df, metadata, sketch_relative_accuracy)
+    sketch = QuantileSketch(sketch_relative_accuracy) if sketch_relative_accuracy else None
+    appended_df, rows_count = _read_clean_rows_by_chunks(
+        appended_bytes, chunksize or Settings.dataset_chunksize, names=names, seen_hashes=seen_hashes, sketch=sketch
+    )
+
+    # continue the index of the rows with their positions in the file
+    appended_df.index += source["rows_count"]
+
+    for column in ["Invoice ID", "Stock Code"]:
+        appended_df[column] = appended_df[column].cat.remove_unused_categories()
+    appended_df, code_by_country = encode_countries(appended_df, code_by_country)
+    appended_df = cast_column_types(appended_df)
+
+    for column in ["Invoice ID", "Stock Code", "Country"]:
+        categories = union_categoricals([df[column], appended_df[column]], sort_categories=True).categories
+        df[column] = df[column].cat.set_categories(categories)
+        appended_df[column] = appended_df[column].cat.set_categories(categories)
+
+    merged_df = pd.concat([df, appended_df]).sort_values("Invoice Date", kind="stable")
+
+    if sketch:
+        sketch.merge(previous_sketch)
+
+    logger.info(f"Appended {len(appended_df)} rows")
+
+    metadata = {
+        **metadata,
+        "source": {**source, "rows_count": source["rows_count"] + rows_count},
+        "code_by_country": code_by_country,
+        "total_cost_sketch": sketch.to_dict() if sketch else None,
+    }
+
+    return merged_df, metadata
 
+
+def _total_cost_sketch(df, metadata, sketch_relative_accuracy):
+    if not sketch_relative_accuracy:
+        return None
+
+    sketch_dict = metadata.get("total_cost_sketch")
+    if sketch_dict and sketch_dict["relative_accuracy"] == sketch_relative_accuracy:
+        return QuantileSketch.from_dict(sketch_dict)
+
+    # the dataset was cached with another accuracy of the sketch or without it
+    return QuantileSketch(sketch_relative_accuracy).update(df["Total Cost"])
+
+
+def _read_clean_rows_by_chunks(source, chunksize, names=None, seen_hashes=None, sketch=None):
+    # Only the cleaned chunks with compact column types are kept in memory.
+    # Duplicated rows are found by their hashes seen in previous chunks.
+    chunks = []
+    rows_count = 0
+    if seen_hashes is None:
+        seen_hashes = np.empty(0, dtype=np.uint64)
+
+    with _read_csv(source, chunksize=chunksize, names=names) as reader:
+        for chunk in reader:
+            rows_count += len(chunk)
+            chunk = cast_column_types(_clean_rows(chunk))
+
+            hashes = _row_hashes(chunk)
+            is_unique = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen_hashes)
+            seen_hashes = np.concatenate([seen_hashes, hashes[is_unique]])
+
+            chunk = chunk[is_unique]
+            if sketch:
+                sketch.update(chunk["Total Cost"])
+
+            chunks.append(chunk)
+
+    # unify categories of chunks to keep categorical columns after concatenation
+    for column in ["Invoice ID", "Stock Code", "Country"]:
+        categories = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True).categories
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(categories)
+
+    return pd.concat(chunks), rows_count
+
+
+def _row_hashes(df, code_by_country=None):
+    if code_by_country:
+        # hash encoded countries by names, as they are in the rows read from the file
+        df = df.assign(Country=df["Country"].cat.rename_categories({code: c for c, code in code_by_country.items()}))
+
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _read_csv(source, chunksize=None, names=None):
+    return pd.read_csv(
+        source,
+        names=names,
+        header=None if names else "infer",
+        usecols=[*_csv_dtypes.keys(), "InvoiceDate"],
+        dtype=_csv_dtypes,
+        chunksize=chunksize,
+    )
+
+
+def _clean_rows(df):
     df = df.dropna()
     df = df.drop(df[df["Quantity"] <= 0].index)
-    df = df.drop_duplicates()
 
     df.rename(
         {
@@ -22,56 +282,56 @@ def do_prepare_dataframe(csv_path=Settings.dataset_csv_path):
         inplace=True,
     )
 
+    # parsing dates here is several times faster than read_csv's parse_dates combined with dtype
+    df["Invoice Date"] = pd.to_datetime(df["Invoice Date"], format=_csv_date_format)
     df["Total Cost"] = df["Quantity"] * df["Price"]
 
-    # we encode the countries to a numerical value to prevent correlation analysis crash
-    df, code_by_country = encode_countries(df)
-
-    df = cast_column_types(df)
-
-    # sort for time series analysis
-    df = df.sort_values("Invoice Date")
-
-    df = reject_outliers_by_iqr(df, "Total Cost")
-
-    return df, code_by_country
+    return df
 
 
 def cast_column_types(df):
     """Casts the column types of the given DataFrame.
 
+    Columns that already have the appropriate type are left as they are.
+
     Args:
         df (pd.DataFrame): The DataFrame to be processed.
 
     Returns:
         pd.DataFrame: The processed DataFrame with updated column types.
     """
-    df["Invoice ID"] = pd.Categorical(df["Invoice ID"])
-    df["Stock Code"] = pd.Categorical(df["Stock Code"])
-    df["Stock Description"] = df["Stock Description"].astype("string")
-    df["Quantity"] = df["Quantity"].astype("Int64")
-    df["Invoice Date"] = pd.to_datetime(df["Invoice Date"])
-    df["Price"] = df["Price"].astype("Float64")
-    df["Customer ID"] = df["Customer ID"].astype("Float64")
-    df["Country"] = pd.Categorical(df["Country"])
+    for column, dtype in _column_types.items():
+        if df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
 
     return df
 
 
-def encode_countries(df):
+def _log_memory_usage(df):
+    memory_usage = df.memory_usage(deep=True)
+    columns_usage = ", ".join(f"{column}: {size / 2**20:.1f}" for column, size in memory_usage.items())
+    logger.info(f"Prepared dataframe of shape {df.shape} takes {memory_usage.sum() / 2**20:.1f} MiB ({columns_usage})")
+
+
+def encode_countries(df, code_by_country=None):
     """Encode the 'Country' column in the given DataFrame using numerical codes.
 
     Parameters:
         df (pandas.DataFrame): The DataFrame containing the 'Country' column to be encoded.
+        code_by_country (dict, optional): Codes of already encoded countries to reuse,
+            new countries get the following codes.
 
     Returns:
         tuple: A tuple containing the updated DataFrame with the 'Country' column encoded,
         and a dictionary mapping countries to their corresponding codes.
     """
 
-    code_by_country = {country: code + 1 for code, country in enumerate(df["Country"].unique())}
-    df.loc[:, "Country"] = df.loc[:, "Country"].map(code_by_country)
-    df["Country"] = pd.Categorical(df["Country"])
+    code_by_country = dict(code_by_country or {})
+    for country in df["Country"].unique():
+        if country not in code_by_country:
+            code_by_country[country] = len(code_by_country) + 1
+
+    df["Country"] = pd.Categorical(df["Country"].map(code_by_country).astype("int64"))
     return df, code_by_country
 
 
@@ -94,22 +354,36 @@ def decode_countries(df, code_by_country):
     return df
 
 
-def reject_outliers_by_iqr(df, column):
+def reject_outliers_by_iqr(df, column, sketch=None):
     """Reject outlier values by given dataframe's column using the Interquartile Range (IQR) method.
 
     Parameters:
         df (pandas.DataFrame): The DataFrame from which to filter outliers.
         column (str): The name of the column on which to filter outliers.
+        sketch (QuantileSketch, optional): The sketch of the column values to estimate quartiles with,
+            instead of calculating exact ones over the column.
 
     Returns:
         pandas.DataFrame: The DataFrame with the outliers removed.
     """
 
-    q1 = df[column].quantile(0.25)
-    q3 = df[column].quantile(0.75)
-    iqr = q3 - q1
-
-    lower_bound = q1 - 1.5 * iqr
-    upper_bound = q3 + 1.5 * iqr
+    lower_bound, upper_bound = iqr_bounds(df[column] if sketch is None else sketch)
 
     return df[(df[column] >= lower_bound) & (df[column] <= upper_bound)]
+
+
+def iqr_bounds(values):
+    """Calculates the bounds of not outlier values using the Interquartile Range (IQR) method.
+
+    Parameters:
+        values (pandas.Series | QuantileSketch): The values or their sketch to calculate bounds for.
+
+    Returns:
+        tuple: A tuple containing the lower and the upper bound.
+    """
+
+    q1 = values.quantile(0.25)
+    q3 = values.quantile(0.75)
+    iqr = q3 - q1
+
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
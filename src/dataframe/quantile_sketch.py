@@ -0,0 +1,137 @@
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable sketch of values distribution that estimates quantiles with a bounded relative error.
+
+    The sketch counts values in logarithmically sized buckets (DDSketch), so it takes little memory,
+    can be built over chunks of values, merged with sketches of other partitions, and persisted as a dict.
+    An estimated quantile differs from the exact one by no more than relative_accuracy of its value.
+
+    Parameters:
+        relative_accuracy (float, optional): The relative error bound of estimated quantiles. Default is 0.01.
+    """
+
+    # values closer to zero than this are counted as zeros
+    _min_value = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy should be between 0 and 1, got {relative_accuracy}")
+
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._zero_count = 0
+        self._positive_counts = {}
+        self._negative_counts = {}
+
+    @property
+    def count(self):
+        """The number of values added to the sketch."""
+        return self._zero_count + sum(self._positive_counts.values()) + sum(self._negative_counts.values())
+
+    def update(self, values):
+        """Adds values to the sketch, NaN values are skipped.
+
+        Parameters:
+            values (array-like): The values to add.
+
+        Returns:
+            QuantileSketch: The sketch itself.
+        """
+
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+
+        self._zero_count += int(np.count_nonzero(np.abs(values) < self._min_value))
+        self._add_to_buckets(self._positive_counts, values[values >= self._min_value])
+        self._add_to_buckets(self._negative_counts, -values[values <= -self._min_value])
+
+        return self
+
+    def merge(self, other):
+        """Adds values counted by the other sketch to this sketch.
+
+        Parameters:
+            other (QuantileSketch): The sketch with the same relative accuracy to merge.
+
+        Returns:
+            QuantileSketch: The sketch itself.
+        """
+
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                f"Can't merge sketches of different relative accuracy \
+{self.relative_accuracy} and {other.relative_accuracy}"
+            )
+
+        self._zero_count += other._zero_count
+        for counts, other_counts in [
+            (self._positive_counts, other._positive_counts),
+            (self._negative_counts, other._negative_counts),
+        ]:
+            for key, count in other_counts.items():
+                counts[key] = counts.get(key, 0) + count
+
+        return self
+
+    def quantile(self, q):
+        """Estimates the value at the given quantile.
+
+        Parameters:
+            q (float): The quantile between 0 and 1.
+
+        Returns:
+            float: The estimated value, or NaN if the sketch is empty.
+        """
+
+        count = self.count
+        if count == 0:
+            return math.nan
+
+        negative_keys = np.array(sorted(self._negative_counts, reverse=True), dtype="int64")
+        positive_keys = np.array(sorted(self._positive_counts), dtype="int64")
+
+        values = np.concatenate([-self._bucket_values(negative_keys), [0.0], self._bucket_values(positive_keys)])
+        counts = np.concatenate(
+            [
+                [self._negative_counts[key] for key in negative_keys],
+                [self._zero_count],
+                [self._positive_counts[key] for key in positive_keys],
+            ]
+        )
+
+        rank = q * (count - 1)
+        return float(values[np.searchsorted(np.cumsum(counts), rank, side="right")])
+
+    def to_dict(self):
+        """Returns the JSON serializable representation of the sketch."""
+
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self._zero_count,
+            "positive_counts": {str(key): count for key, count in self._positive_counts.items()},
+            "negative_counts": {str(key): count for key, count in self._negative_counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        """Creates the sketch from the representation returned by to_dict."""
+
+        sketch = cls(sketch_dict["relative_accuracy"])
+        sketch._zero_count = sketch_dict["zero_count"]
+        sketch._positive_counts = {int(key): count for key, count in sketch_dict["positive_counts"].items()}
+        sketch._negative_counts = {int(key): count for key, count in sketch_dict["negative_counts"].items()}
+        return sketch
+
+    def _add_to_buckets(self, counts, magnitudes):
+        keys, keys_counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype("int64"), return_counts=True)
+        for key, count in zip(keys.tolist(), keys_counts.tolist()):
+            counts[key] = counts.get(key, 0) + count
+
+    def _bucket_values(self, keys):
+        # the value in the middle of the bucket (gamma^(key-1), gamma^key] in terms of the relative error
+        return 2 * np.power(self._gamma, keys) / (self._gamma + 1)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+
+def build_transaction_store(df):
+    """Encodes the baskets of all invoices once, so the baskets of any selected countries are rows of it.
+
+    Each invoice is expected to be in a single country. Baskets are sorted by country,
+    so the baskets of a country are a contiguous slice of rows.
+
+    Parameters:
+        df (pandas.DataFrame): The prepared DataFrame.
+
+    Returns:
+        dict: The store with the "baskets" CSR matrix counting each stock code (column) in each invoice (row),
+        the sorted stock codes of its columns as "items", the "countries" and the "total_costs" of each basket,
+        and the first "descriptions" of each stock code in each country.
+    """
+
+    countries = df["Country"].to_numpy(dtype="int64")
+    invoices = df["Invoice ID"].cat.codes.to_numpy(dtype="int64")
+
+    # columns are ordered by stock code, as the association rules are found between sorted items
+    stock_codes = df["Stock Code"].cat.categories.to_numpy()
+    order = np.argsort(stock_codes, kind="stable")
+    item_ids = np.empty(len(order), dtype="int64")
+    item_ids[order] = np.arange(len(order))
+    item_ids = item_ids[df["Stock Code"].cat.codes.to_numpy()]
+    items = stock_codes[order]
+
+    # stable sort keeps rows of each invoice in the order of the dataset
+    rows = np.lexsort((invoices, countries))
+    basket_keys = countries[rows] * (invoices.max(initial=0) + 1) + invoices[rows]
+    basket_ids = np.cumsum(np.diff(basket_keys, prepend=-1) != 0) - 1
+    baskets_count = int(basket_ids[-1]) + 1 if len(basket_ids) else 0
+
+    baskets = csr_matrix(
+        (np.ones(len(rows), dtype="int64"), (basket_ids, item_ids[rows])), shape=(baskets_count, len(items))
+    )
+    basket_starts = np.flatnonzero(np.diff(basket_ids, prepend=-1))
+
+    return {
+        "baskets": baskets,
+        "items": items,
+        "countries": countries[rows][basket_starts],
+        # summed in the order of the dataset rows, as grouping the invoice rows does
+        "total_costs": pd.Series(df["Total Cost"].to_numpy()[rows]).groupby(basket_ids, sort=False).sum().to_numpy(),
+        "descriptions": _first_descriptions(df, countries, item_ids, items),
+    }
+
+
+def transactions_within(store, country_code=None, reject_country_code=None):
+    """Takes the baskets of the selected countries from the store, without grouping the dataset again.
+
+    Parameters:
+        store (dict): The store returned by build_transaction_store.
+        country_code (int, optional): The code of the selected country, or None for all countries.
+        reject_country_code (int, optional): The code of the rejected country, if any.
+
+    Returns:
+        dict: The "baskets" CSR matrix and their "total_costs" of the selected countries,
+        the "items" of the matrix columns, and the first "description_by_stock_code" within the countries.
+    """
+
+    rows = slice(None)
+    if country_code:
+        rows = slice(*_country_bounds(store["countries"], country_code))
+    elif reject_country_code:
+        start, stop = _country_bounds(store["countries"], reject_country_code)
+        rows = np.r_[0:start, stop : len(store["countries"])]
+
+    descriptions = store["descriptions"]
+    if country_code:
+        descriptions = descriptions[descriptions["Country"] == country_code]
+
+    if reject_country_code:
+        descriptions = descriptions[descriptions["Country"] != reject_country_code]
+
+    description_by_stock_code = (
+        descriptions.sort_values("Position").drop_duplicates("Stock Code").set_index("Stock Code")["Stock Description"]
+    )
+
+    return {
+        "baskets": store["baskets"][rows],
+        "items": store["items"],
+        "total_costs": store["total_costs"][rows],
+        "description_by_stock_code": description_by_stock_code,
+    }
+
+
+def _country_bounds(countries, country_code):
+    return countries.searchsorted(country_code, side="left"), countries.searchsorted(country_code, side="right")
+
+
+def _first_descriptions(df, countries, item_ids, items):
+    # the first description of each stock code in each country, by its position in the dataset
+    has_description = df["Stock Description"].notna().to_numpy()
+    positions = np.flatnonzero(has_description)
+    keys, first = np.unique(countries[positions] * len(items) + item_ids[positions], return_index=True)
+    positions = positions[first]
+
+    return pd.DataFrame(
+        {
+            "Country": keys // len(items),
+            "Stock Code": items[keys % len(items)],
+            "Position": positions,
+            "Stock Description": df["Stock Description"].to_numpy()[positions],
+        }
+    )
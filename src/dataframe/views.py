@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.settings import Settings
+
+_view_key_attr = "view_key"
+_dataset_key_attr = "dataset_key"
+
+# Row positions of each country by the key of the versioned dataset, built once per dataset version
+_country_rows_by_dataset = {}
+
+
+def versioned_dataset(df, dataset_version):
+    """Marks the prepared dataset with its version, so views and tables derived from it are cached by that version,
+    and builds the row indexes of the dataset for the filters.
+
+    The dataset is expected to be sorted by Invoice Date, as do_prepare_dataframe returns it.
+    Its index is replaced with row positions, so views sliced from it know where their rows are in the dataset.
+
+    Parameters:
+        df (pandas.DataFrame): The prepared DataFrame.
+        dataset_version (str): The version of the dataset, changing when its rows change.
+
+    Returns:
+        pandas.DataFrame: The same DataFrame.
+    """
+
+    dataset_key = f"dataset{dataset_version}_"
+
+    df.index = pd.RangeIndex(len(df))
+    df.attrs[_view_key_attr] = dataset_key
+    df.attrs[_dataset_key_attr] = dataset_key
+    _country_rows_by_dataset[dataset_key] = _country_rows(df["Country"].to_numpy())
+
+    return df
+
+
+def view_key(df):
+    """Returns the key identifying the DataFrame by the dataset version and the filters applied to it,
+    or None if the DataFrame is not derived from a versioned dataset."""
+
+    return df.attrs.get(_view_key_attr)
+
+
+def dataset_key(df):
+    """Returns the key identifying the version of the dataset the DataFrame is derived from,
+    or None if the DataFrame is not derived from a versioned dataset."""
+
+    return df.attrs.get(_dataset_key_attr)
+
+
+def cached_view(df, filter_key, filter_fun):
+    """Filters the DataFrame once per dataset version and filters, sharing the result across reruns and sessions.
+
+    Unlike st.cache_data, the DataFrame is neither hashed nor copied on each call.
+    Concurrent calls with the same key, like sessions opening the same page, wait for one filtering.
+    The returned view is shared, so it should be treated as read-only.
+
+    Parameters:
+        df (pandas.DataFrame): The DataFrame to be filtered.
+        filter_key (str): The key of the filter, as built for the sidebar filters.
+        filter_fun (function): A function filtering the DataFrame passed to it.
+
+    Returns:
+        pandas.DataFrame: The filtered DataFrame.
+    """
+
+    key = view_key(df)
+    if key is None:
+        return filter_fun(df)
+
+    def filter_with_key(df):
+        view = filter_fun(df)
+        view.attrs[_view_key_attr] = key + filter_key
+        return view
+
+    return _cached(df, key + filter_key, filter_with_key)
+
+
+def cached_table(df, table_key, table_fun):
+    """Calculates the table from the DataFrame once per its dataset version and filters,
+    sharing the result across reruns and sessions.
+
+    Concurrent calls with the same key wait for one calculation.
+    The returned table is shared, so it should be treated as read-only.
+
+    Parameters:
+        df (pandas.DataFrame): The DataFrame to calculate the table from.
+        table_key (str): The key of the table and its parameters.
+        table_fun (function): A function calculating the table from the DataFrame passed to it.
+
+    Returns:
+        The calculated table.
+    """
+
+    key = view_key(df)
+    if key is None:
+        return table_fun(df)
+
+    return _cached(df, key + table_key, table_fun)
+
+
+# st.cache_resource computes a missing value under the lock of its key, so concurrent calls coalesce into one
+@st.cache_resource(max_entries=Settings.views_cache_max_entries)
+def _cached(_df, key, _fun):
+    return _fun(_df)
+
+
+def filter_by_date_range(df, start, end):
+    """Filters the DataFrame sorted by Invoice Date by the given range of dates,
+    finding the rows with binary search instead of comparing every date.
+
+    Parameters:
+        df (pandas.DataFrame): The DataFrame sorted by Invoice Date, as the prepared dataset and its views are.
+        start (pandas.Timestamp): The first date to keep.
+        end (pandas.Timestamp): The last date to keep.
+
+    Returns:
+        pandas.DataFrame: The slice of the DataFrame within the dates.
+    """
+
+    dates = df["Invoice Date"].to_numpy()
+    start_position = dates.searchsorted(start.to_datetime64(), side="left")
+    end_position = dates.searchsorted(end.to_datetime64(), side="right")
+
+    return df.iloc[start_position:end_position]
+
+
+def filter_by_country_code(df, country_code, reject_country_code):
+    """Filters the DataFrame based on the given country code and reject country code.
+
+    The rows of views sliced from a versioned dataset, like the date ranges, are taken by the country index
+    of the dataset, other DataFrames are filtered by comparing every country code.
+
+    Parameters:
+        df (pandas.DataFrame): The DataFrame to be filtered.
+        country_code (int): The country code to filter by.
+        reject_country_code (int): The country code to reject by.
+
+    Returns:
+        pandas.DataFrame: The filtered DataFrame.
+    """
+
+    country_rows = _country_rows_by_dataset.get(df.attrs.get(_dataset_key_attr))
+    index = df.index
+    if country_rows is None or not isinstance(index, pd.RangeIndex) or index.step != 1:
+        return _filter_by_country_code_values(df, country_code, reject_country_code)
+
+    if country_code:
+        positions = _positions_within(country_rows.get(country_code), index.start, index.stop)
+        return _filter_by_country_code_values(df.iloc[positions - index.start], None, reject_country_code)
+
+    if reject_country_code:
+        is_kept = np.ones(len(df), dtype=bool)
+        is_kept[_positions_within(country_rows.get(reject_country_code), index.start, index.stop) - index.start] = False
+        return df.iloc[is_kept]
+
+    return df
+
+
+def _filter_by_country_code_values(df, country_code, reject_country_code):
+    if country_code:
+        df = df[df["Country"] == country_code]
+
+    if reject_country_code:
+        df = df[df["Country"] != reject_country_code]
+
+    return df
+
+
+def _country_rows(countries):
+    # stable sort keeps the row positions of each country ascending
+    positions = np.argsort(countries, kind="stable")
+    codes, starts = np.unique(countries[positions], return_index=True)
+    return dict(zip(codes.tolist(), np.split(positions, starts[1:])))
+
+
+def _positions_within(positions, start, stop):
+    if positions is None:
+        return np.empty(0, dtype=np.intp)
+
+    return positions[positions.searchsorted(start) : positions.searchsorted(stop)]
@@ -0,0 +1,25 @@
+from concurrent.futures import wait
+import time
+
+
+def wait_for_job(job, notice, message_fun):
+    """Waits for the background job to be done, showing its progress in the notice meanwhile.
+
+    Updating the notice lets streamlit stop the script, when the user changes filters during the wait.
+
+    Args:
+        job (concurrent.futures.Future): The future of the job, as returned by submit_job.
+        notice: The st.empty placeholder to show the progress in.
+        message_fun (function): A function returning the message for the seconds passed since the wait started.
+
+    Returns:
+        The result of the job.
+    """
+
+    started_at = time.perf_counter()
+    while not job.done():
+        notice.info(message_fun(time.perf_counter() - started_at), icon="⏳")
+        wait([job], timeout=0.5)
+
+    notice.empty()
+    return job.result()
@@ -1,6 +1,7 @@
 import pandas as pd
 import streamlit as st
 
+from src.dataframe.views import cached_view, filter_by_country_code, filter_by_date_range
 from src.logger import logger
 
 
@@ -74,7 +75,7 @@ def date_range_filter(df, filter_key=""):
     if len(date) == 2 and (date[0] != min_date or date[1] != max_date):
         if date[0] >= min_date and date[1] <= max_date:
             df = do_filter_by_date(df, date)
-            filter_key += f"_date{date[0]}_{date[1]}_" if date else ""
+            filter_key = date_filter_key(filter_key, date)
         else:
             date = None
             st.error(
@@ -90,9 +91,35 @@ our dataset record the transaction between {min_date} to {max_date}",
     return df, filter_key, date
 
 
-@st.cache_data
+def date_filter_key(filter_key, date):
+    """Append a date range suffix to filter key.
+
+    Args:
+        filter_key (str): The base filter key.
+        date (tuple): The date range to include in the filter key.
+
+    Returns:
+        str: The constructed filter key.
+    """
+    filter_key += f"_date{date[0]}_{date[1]}_" if date else ""
+    return filter_key
+
+
 def do_filter_by_date(df, date):
-    return df[(df["Invoice Date"] >= pd.to_datetime(date[0])) & (df["Invoice Date"] <= pd.to_datetime(date[1]))]
+    """Filters the DataFrame by the given date range, the result is cached by the dataset version and the dates.
+
+    Args:
+        df (pandas.DataFrame): The DataFrame to be filtered.
+        date (tuple): The date range to filter by.
+
+    Returns:
+        pandas.DataFrame: The filtered DataFrame, shared between calls, so it should not be modified.
+    """
+    return cached_view(
+        df,
+        date_filter_key("", date),
+        lambda df: filter_by_date_range(df, pd.to_datetime(date[0]), pd.to_datetime(date[1])),
+    )
 
 
 def country_filter(df, code_by_country, filter_key=""):
@@ -161,6 +188,24 @@ def rejected_uk_country(code_by_country):
     return uk_name, uk_code
 
 
+def selected_country_codes(code_by_country, country, rejected_country):
+    """Get the codes of the country and the rejected country selected with the country filter.
+
+    Args:
+        code_by_country (dict): A dictionary mapping country names to country codes.
+        country (str): The selected country in "Country name (code)" format, or None.
+        rejected_country (str): The name of the rejected country, or None.
+
+    Returns:
+        tuple: A tuple containing the selected country code and the rejected country code, each can be None.
+    """
+    code_by_label = {f"{name} ({code})": code for name, code in code_by_country.items()}
+    country_code = code_by_label[country] if country else None
+    reject_country_code = code_by_country[rejected_country] if rejected_country else None
+
+    return country_code, reject_country_code
+
+
 def country_filter_key(filter_key, country_code, reject_country_code):
     """Append a country suffix to filter key based on the provided country code and reject country code.
 
@@ -178,9 +223,9 @@ def country_filter_key(filter_key, country_code, reject_country_code):
     return filter_key
 
 
-@st.cache_data
 def do_filter_by_country_code(df, country_code, reject_country_code):
-    """Filters the DataFrame based on the given country code and reject country code.
+    """Filters the DataFrame based on the given country code and reject country code,
+    the result is cached by the dataset version and the codes.
 
     Args:
         df (pandas.DataFrame): The DataFrame to be filtered.
@@ -188,12 +233,10 @@ def do_filter_by_country_code(df, country_code, reject_country_code):
         reject_country_code (str): The country code to reject by.
 
     Returns:
-        pandas.DataFrame: The filtered DataFrame.
+        pandas.DataFrame: The filtered DataFrame, shared between calls, so it should not be modified.
     """
-    if country_code:
-        df = df[df["Country"] == country_code]
-
-    if reject_country_code:
-        df = df[df["Country"] != reject_country_code]
-
-    return df
+    return cached_view(
+        df,
+        country_filter_key("", country_code, reject_country_code),
+        lambda df: filter_by_country_code(df, country_code, reject_country_code),
+    )
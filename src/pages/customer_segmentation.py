@@ -2,12 +2,66 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 
-from src.analysis.segmentation import k_means_centroids, rfm_scores, summarize_segments
-from src.pages.components.sidebar import append_filters_title, country_filter, date_range_filter, enable_sidebar_filters
+from src.analysis.segmentation import (
+    k_means_segmentations,
+    rfm_prefix_aggregates,
+    rfm_scores,
+    rfm_scores_within,
+    summarize_segments,
+)
+from src.analysis.segmentation_model import segmentation_model_file_name, write_segmentation_model
+from src.dataframe.manifest import (
+    artifact_fingerprint,
+    country_fingerprints,
+    is_up_to_date,
+    read_manifest,
+    record_artifact,
+    write_manifest,
+)
+from src.dataframe.views import cached_table, dataset_key
+from src.logger import logger
+from src.pages.components.sidebar import (
+    append_filters_title,
+    country_filter,
+    country_filter_key,
+    date_range_filter,
+    enable_sidebar_filters,
+    selected_country_codes,
+)
+from src.settings import Settings
+
+
+_segment_counts = [2, 3, 4, 5]
+# Increment when the fitting of segmentation models changes, to fit them again on the next deployment
+_prepared_data_version = 1
 
 
 def maybe_prepare_data_on_disk(df, code_by_country):
-    pass
+    # Models are fitted again only when the customers' rows or the fitting parameters change
+    manifest = read_manifest(Settings.prepared_data_path)
+    fingerprint = artifact_fingerprint(
+        countries=country_fingerprints(df, code_by_country),
+        version=_prepared_data_version,
+        exact_max_samples=Settings.k_means_exact_max_samples,
+        sample_size=Settings.k_means_sample_size,
+    )
+    file_names = {
+        segment_count: segmentation_model_file_name(Settings.prepared_data_path, segment_count)
+        for segment_count in _segment_counts
+    }
+    if all(is_up_to_date(manifest, file_name, fingerprint) for file_name in file_names.values()):
+        logger.info(f"Segmentation models of {_segment_counts} segments are up to date.")
+        return
+
+    # Models fitted to all customers let batch jobs assign segments with score_segments.py without clustering again
+    segmentations = k_means_segmentations(rfm_scores(df), _segment_counts)
+
+    for segment_count, segmentation in segmentations.items():
+        write_segmentation_model(file_names[segment_count], segmentation["model"])
+        record_artifact(manifest, file_names[segment_count], fingerprint)
+
+    write_manifest(Settings.prepared_data_path, manifest)
+    logger.info(f"Segmentation models of {_segment_counts} segments are prepared in {Settings.prepared_data_path}")
 
 
 def maybe_initialize_session_state(st):
@@ -16,7 +70,11 @@ def maybe_initialize_session_state(st):
 
 def render(st, df, code_by_country):
     enable_sidebar_filters()
+    # The aggregates of the whole dataset give RFM statistics for any filters
+    aggregates = cached_table(df, "_rfm_prefix_aggregates", rfm_prefix_aggregates)
+
     df, segment_count, dates, country, rejected_country = _apply_sidebar_filters(df, code_by_country)
+    country_code, reject_country_code = selected_country_codes(code_by_country, country, rejected_country)
 
     st.title(
         append_filters_title("Customer Segmentation", dates, country, rejected_country), anchor="customer-segmentation"
@@ -24,8 +82,18 @@ def render(st, df, code_by_country):
 
     st.write("We use K-Means method to segment customers by normalized Recency Frequency and Monetary (RFM) values.")
 
-    rfm_scores, rfm_segments, rfm_segments_summary, features_importance = _rfm_tables(df, segment_count)
-    rfm_scores["Customer ID"] = pd.Categorical(rfm_scores["Customer ID"])
+    # all segment counts are fitted together, so switching between them is a cache hit,
+    # and they start from the segments of the previous dates of the same countries of the dataset version
+    segmentations, segmentations_quality = cached_table(
+        df,
+        "_rfm_segmentations_",
+        lambda _df: _rfm_tables(
+            rfm_scores_within(aggregates, dates, country_code, reject_country_code),
+            warm_start_key=f"{dataset_key(df)}{country_filter_key('', country_code, reject_country_code)}",
+        ),
+    )
+    rfm_segments = segmentations[segment_count]["segments"]
+    rfm_segments_summary = segmentations[segment_count]["summary"]
 
     st.header("🗂 Axis")
     st.markdown("""
@@ -48,13 +116,14 @@ def render(st, df, code_by_country):
 
     st.header("📊 Recency, Frequency, and Monetary Segmentation Exploration")
 
-    tab0, tab1, tab2, tab3, tab4 = st.tabs(
+    tab0, tab1, tab2, tab3, tab4, tab5 = st.tabs(
         [
             "Customers Distribution",
             "3D Plot of RFM",
             "1️⃣ Recency vs Frequency",
             "2️⃣ Recency vs Monetary",
             "3️⃣ Frequency vs Monetary",
+            "🔢 Segments Count Quality",
         ]
     )
 
@@ -124,13 +193,38 @@ def render(st, df, code_by_country):
         fig.update_layout(xaxis_title="Frequency (Invoices)")
         st.plotly_chart(fig, use_container_width=True)
 
+    with tab5:
+        st.write(
+            "The inertia drops slower after the count where segments stop to be distinct (elbow), "
+            "and the silhouette, estimated on a sample of customers, is higher for better separated segments."
+        )
+        quality_col1, quality_col2 = st.columns(2)
+
+        with quality_col1:
+            fig = px.line(segmentations_quality, x="Segments count", y="Inertia", markers=True, title="Elbow")
+            fig.update_xaxes(dtick=1)
+            st.plotly_chart(fig, use_container_width=True)
+
+        with quality_col2:
+            fig = px.line(segmentations_quality, x="Segments count", y="Silhouette", markers=True, title="Silhouette")
+            fig.update_xaxes(dtick=1)
+            st.plotly_chart(fig, use_container_width=True)
+
+
+def _rfm_tables(scores, warm_start_key):
+    segmentations = k_means_segmentations(scores, _segment_counts, warm_start_key=warm_start_key)
+    for segmentation in segmentations.values():
+        segmentation["summary"] = summarize_segments(segmentation["segments"])
+
+    segmentations_quality = pd.DataFrame(
+        {
+            "Segments count": list(segmentations.keys()),
+            "Inertia": [segmentation["inertia"] for segmentation in segmentations.values()],
+            "Silhouette": [segmentation["silhouette"] for segmentation in segmentations.values()],
+        }
+    )
 
-@st.cache_data
-def _rfm_tables(df, segments):
-    scores = rfm_scores(df)
-    segments, features_importance = k_means_centroids(scores, n_clusters=segments)
-    segments_summary = summarize_segments(segments)
-    return scores, segments, segments_summary, features_importance
+    return segmentations, segmentations_quality
 
 
 def _apply_sidebar_filters(df, code_by_country):
@@ -139,6 +233,6 @@ def _apply_sidebar_filters(df, code_by_country):
 
     st.sidebar.subheader("🍰 Segments count")
 
-    segment_count = st.sidebar.selectbox("Select the number of segments you want to create:", [2, 3, 4, 5])
+    segment_count = st.sidebar.selectbox("Select the number of segments you want to create:", _segment_counts)
 
     return df, segment_count, dates, country, rejected_country
@@ -1,19 +1,23 @@
+import time
+
 import plotly.express as px
-import streamlit as st
 from streamlit_ydata_profiling import st_profile_report
 from ydata_profiling import ProfileReport
 
-from src.dataframe.preprocess import decode_countries
+from src.background_jobs import submit_job
+from src.dataframe.daily_cube import build_daily_country_cube, customers_by_country, revenue_by_country
 from src.dataframe.sample import take_sample
+from src.dataframe.views import cached_table, view_key
 from src.logger import logger
+from src.pages.components.background_job import wait_for_job
 from src.pages.components.sidebar import (
     append_filters_title,
     country_filter,
     date_range_filter,
-    disable_sidebar_filters,
     enable_sidebar_filters,
+    selected_country_codes,
 )
-from src.reports_cache import get_cached_report, is_report_cached
+from src.reports_cache import find_cached_report, get_cached_report
 from src.settings import Settings
 
 
@@ -28,30 +32,31 @@ def maybe_initialize_session_state(st):
 
 
 def render(st, df, code_by_country):
+    enable_sidebar_filters()
+    # The cube of the whole dataset answers the charts for any filters
+    cube = cached_table(df, "_daily_country_cube", build_daily_country_cube)
+
     # Apply filters
     df, filter_key, dates, country, rejected_country = _apply_sidebar_filters(df, code_by_country)
+    country_code, reject_country_code = selected_country_codes(code_by_country, country, rejected_country)
 
     st.title(append_filters_title("Data Exploration", dates, country, rejected_country), anchor="data-exploration")
 
-    logger.info(f"Data Exploration filter_key: {filter_key}, \
-cached: {is_report_cached(st.session_state, filter_key)}")
-
-    if not is_report_cached(st.session_state, filter_key):
-        disable_sidebar_filters()
+    logger.info(f"Data Exploration filter_key: {filter_key}")
 
     st.header("Full dataset statistics")
 
     charts_col1, charts_col2 = st.columns(2)
 
     with charts_col1:
-        customers_by_country = _customers_by_country(df, code_by_country)
-        fig = px.bar(customers_by_country, x="Country", y="Customers count", title="Customers per Country")
+        customers = customers_by_country(cube, code_by_country, dates, country_code, reject_country_code)
+        fig = px.bar(customers, x="Country", y="Customers count", title="Customers per Country")
         fig.update_traces(yhoverformat=Settings.plot_integer_format)
         st.plotly_chart(fig, use_container_width=True)
 
     with charts_col2:
-        revenue_by_country = _revenue_by_country(df, code_by_country)
-        fig = px.bar(revenue_by_country, x="Country", y="Revenue", title="Revenue per Country")
+        revenue = revenue_by_country(cube, code_by_country, dates, country_code, reject_country_code)
+        fig = px.bar(revenue, x="Country", y="Revenue", title="Revenue per Country")
         fig.update_traces(yhoverformat=Settings.plot_currency_format)
         st.plotly_chart(fig, use_container_width=True)
 
@@ -60,52 +65,79 @@ cached: {is_report_cached(st.session_state, filter_key)}")
     # Take sample for analysis
     sample, description = take_sample(df)
 
-    report = get_cached_report(
-        session_state=st.session_state,
-        report_name=filter_key,
-        generator_fun=lambda: ProfileReport(
-            sample,
-            explorative=True,
-            tsmode=True,
-            # Setting what variables are time series
-            type_schema={
-                "Quantity": "timeseries",
-            },
-            missing_diagrams={
-                "bar": False,
-                "matrix": False,
-                "heatmap": False,
-            },
-            correlations=None,
-            interactions=None,
-        ),
-    )
-
     if description:
         st.markdown(f"> {description}")
 
-    st_profile_report(report)
+    # The report of the dataset version and filters is generated once for all sessions and server processes
+    report_key = filter_key + (view_key(df) or "")
+    html = _report_html(report_key, sample, st.empty())
+
+    st_profile_report(_HtmlReport(html))
     logger.info("Data Exploration report displayed")
 
-    enable_sidebar_filters()
 
+def _report_html(report_key, sample, progress):
+    html = find_cached_report(report_key)
+    if html is not None:
+        return html
 
-@st.cache_data
-def _customers_by_country(df, code_by_country):
-    customers_by_country = decode_countries(df.copy(), code_by_country)
-    customers_by_country = (
-        customers_by_country.groupby("Country", observed=True).agg({"Customer ID": lambda x: x.nunique()}).reset_index()
+    # The report is generated in background, the filters can be changed meanwhile.
+    # The job returns the report, so it's displayed even when the cache can't hold it,
+    # and a finished job is submitted again, because its report is dropped from the cache already.
+    return wait_for_job(
+        submit_job(
+            report_key,
+            lambda: get_cached_report(report_key, lambda: _generate_report_html(sample)),
+            resubmit_finished=True,
+        ),
+        progress,
+        lambda seconds: f"Generating profile report of {len(sample):,d} records for {seconds:.0f}s...",
     )
-    customers_by_country.rename(columns={"Customer ID": "Customers count"}, inplace=True)
-    return customers_by_country
 
 
-@st.cache_data
-def _revenue_by_country(df, code_by_country):
-    revenue_by_country = decode_countries(df.copy(), code_by_country)
-    revenue_by_country = revenue_by_country.groupby("Country", observed=True)["Total Cost"].sum().reset_index()
-    revenue_by_country.columns = ["Country", "Revenue"]
-    return revenue_by_country
+def _generate_report_html(sample):
+    started_at = time.perf_counter()
+    report = ProfileReport(
+        sample,
+        explorative=True,
+        tsmode=True,
+        # Setting what variables are time series
+        type_schema={
+            "Quantity": "timeseries",
+        },
+        missing_diagrams={
+            "bar": False,
+            "matrix": False,
+            "heatmap": False,
+        },
+        correlations=None,
+        interactions=None,
+    )
+
+    # The same HTML settings as st_profile_report applies to reports of full height
+    report.config.html.inline = True
+    report.config.html.minify_html = True
+    report.config.html.use_local_assets = True
+    report.config.html.navbar_show = False
+    report.config.html.full_width = True
+
+    html = report.to_html()
+    logger.info(f"Generated profile report of {len(sample)} records in {time.perf_counter() - started_at:.2f}s.")
+    return html
+
+
+class _HtmlReport:
+    """The report with ready HTML, to display it with st_profile_report."""
+
+    def __init__(self, html):
+        self._html = html
+
+    def set_variable(self, key, value):
+        # the HTML is generated with the settings of st_profile_report already
+        pass
+
+    def to_html(self):
+        return self._html
 
 
 def _apply_sidebar_filters(df, code_by_country):
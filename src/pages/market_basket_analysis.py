@@ -1,178 +1,265 @@
-import ast
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import reduce
+import json
 import os
 import re
+import time
 
-from apyori import apriori
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 
 import plotly.express as px
 from plotly.graph_objs import Scatter
 import streamlit as st
 
+from src.analysis.association_rules import association_rules, transaction_ids_by_item
+from src.background_jobs import submit_job
+from src.dataframe.manifest import (
+    artifact_fingerprint,
+    country_fingerprints,
+    is_up_to_date,
+    read_manifest,
+    record_artifact,
+    write_manifest,
+)
 from src.dataframe.preprocess import reject_outliers_by_iqr
+from src.dataframe.transaction_store import build_transaction_store, transactions_within
+from src.dataframe.views import filter_by_country_code, view_key
 from src.logger import logger
+from src.pages.components.background_job import wait_for_job
 from src.pages.components.sidebar import (
     append_filters_title,
     country_filter_key,
-    do_filter_by_country_code,
+    date_range_filter,
     enable_sidebar_filters,
     rejected_uk_country,
 )
 from src.settings import Settings
 
 _rules_count_by_country_filename = os.path.join(Settings.prepared_data_path, f"{__name__}_rules_count_by_country.csv")
+_metadata_key = b"market_basket"
+# Increment when the calculation of prepared files changes, to prepare them again on the next deployment
+_prepared_data_version = 1
+_min_confidence = 0.6
+_min_lift = 3
+# To prevent mining running for too long and giving rubbish, fewer transactions are mined with higher support
+_min_support_below_transactions_count = [(100, 0.2), (1000, 0.1), (10000, 0.03)]
+_min_support = 0.01
+_association_rules_schema = pa.schema(
+    [
+        ("Antecedent", pa.string()),
+        ("Consequent", pa.list_(pa.string())),
+        ("Support", pa.float64()),
+        ("Confidence", pa.float64()),
+        ("Lift", pa.float64()),
+        ("Transactions seen", pa.int64()),
+        ("Basket Size Min", pa.int64()),
+        ("Basket Size Avg", pa.int64()),
+        ("Basket Size Median", pa.int64()),
+        ("Basket Size Max", pa.int64()),
+    ]
+)
 
 
 def maybe_prepare_data_on_disk(df, code_by_country):
-    logger.info("Preparing for no filter.")
-    _write_csv_files(df, *_file_names(""))
-
-    logger.info("Preparing for uk rejected.")
-    _uk_name, uk_code = rejected_uk_country(code_by_country)
-    df_uk_rejected = do_filter_by_country_code(df, None, uk_code)
-    file_postfix = country_filter_key("", None, uk_code)
-    _write_csv_files(df_uk_rejected, *_file_names(file_postfix))
-
-    # For each country
-    rules_by_country = {}
-    for country_name, country_code in code_by_country.items():
-        logger.info(f"Preparing for {country_name}.")
-        df_country = do_filter_by_country_code(df, country_code, None)
-        file_postfix = country_filter_key("", country_code, None)
-        rules_count = _write_csv_files(df_country, *_file_names(file_postfix))
-        rules_by_country[country_name] = rules_count
-
-    if not os.path.isfile(_rules_count_by_country_filename) or (
-        os.path.getmtime(_rules_count_by_country_filename) <= os.path.getmtime(Settings.dataset_csv_path)
-    ):
+    # Files are prepared again only when the rows of their countries or the mining parameters change
+    manifest = read_manifest(Settings.prepared_data_path)
+    fingerprint_by_country = country_fingerprints(df, code_by_country)
+    # baskets of all invoices are grouped once, each filter takes its rows
+    store = build_transaction_store(df)
+
+    uk_name, uk_code = rejected_uk_country(code_by_country)
+    # title, country code, rejected country code, and names of countries of each filter
+    filters = [
+        ("no filter", None, None, list(code_by_country)),
+        ("uk rejected", None, uk_code, [name for name in code_by_country if name != uk_name]),
+        *[(country_name, country_code, None, [country_name]) for country_name, country_code in code_by_country.items()],
+    ]
+
+    rules_count_by_title = {}
+    jobs = []
+    for title, country_code, reject_country_code, country_names in filters:
+        file_name = _file_name(country_filter_key("", country_code, reject_country_code))
+        fingerprint = _fingerprint(fingerprint_by_country, country_names)
+        if is_up_to_date(manifest, file_name, fingerprint):
+            rules_count_by_title[title] = feather.read_table(file_name, columns=[]).num_rows
+        else:
+            jobs.append((title, transactions_within(store, country_code, reject_country_code), file_name, fingerprint))
+
+    # Filters are prepared independently, in parallel processes when there are several workers
+    logger.info(f"Preparing {len(jobs)} of {len(filters)} filters with {Settings.prepare_data_workers} workers.")
+    if Settings.prepare_data_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(Settings.prepare_data_workers, len(jobs))) as executor:
+            rules_counts = list(executor.map(_prepare_file, *zip(*[job[:3] for job in jobs])))
+    else:
+        rules_counts = [_prepare_file(*job[:3]) for job in jobs]
+
+    for (title, _transactions, file_name, fingerprint), rules_count in zip(jobs, rules_counts):
+        rules_count_by_title[title] = rules_count
+        record_artifact(manifest, file_name, fingerprint)
+
+    fingerprint = _fingerprint(fingerprint_by_country, code_by_country.keys())
+    if not is_up_to_date(manifest, _rules_count_by_country_filename, fingerprint):
+        rules_by_country = {country_name: rules_count_by_title[country_name] for country_name in code_by_country}
         rbc = pd.DataFrame.from_dict(rules_by_country, orient="index", columns=["Rules Count"])
         rbc.reset_index(inplace=True)
         rbc.rename(columns={"index": "Country"}, inplace=True)
-        rbc.to_csv(_rules_count_by_country_filename, index=False)
+        _to_csv_atomically(rbc, _rules_count_by_country_filename, index=False)
+        record_artifact(manifest, _rules_count_by_country_filename, fingerprint)
 
+    write_manifest(Settings.prepared_data_path, manifest)
 
-def _file_names(postfix=""):
-    return (
-        os.path.join(Settings.prepared_data_path, f"{__name__}_{postfix}_association_rules.csv"),
-        os.path.join(Settings.prepared_data_path, f"{__name__}_{postfix}_transactions_stats.csv"),
-        os.path.join(Settings.prepared_data_path, f"{__name__}_{postfix}_basket_sizes.csv"),
+
+def _fingerprint(fingerprint_by_country, country_names):
+    return artifact_fingerprint(
+        countries={name: fingerprint_by_country[name] for name in country_names}, **_mining_parameters()
     )
 
 
-def _write_csv_files(df, association_rules_file, transactions_stats_file, basket_sizes_file):
-    if not os.path.isfile(association_rules_file) or (
-        os.path.getmtime(association_rules_file) <= os.path.getmtime(Settings.dataset_csv_path)
-    ):
-        description_by_stock_code = df.groupby("Stock Code", observed=True)["Stock Description"].first()
+def _mining_parameters_key():
+    return f"_association_rules{artifact_fingerprint(**_mining_parameters())}_"
 
-        group_by_invoice_id = (
-            df.groupby("Invoice ID", observed=True)
-            .agg({"Stock Code": lambda x: sorted(list(x)), "Total Cost": "sum"})
-            .reset_index()
-        )
 
-        group_by_invoice_id["Basket Size"] = group_by_invoice_id["Stock Code"].apply(len)
+def _mining_parameters():
+    return {
+        "version": _prepared_data_version,
+        "engine": Settings.association_rules_engine,
+        "min_confidence": _min_confidence,
+        "min_lift": _min_lift,
+        "min_support_below_transactions_count": _min_support_below_transactions_count,
+        "min_support": _min_support,
+    }
+
+
+def _prepare_file(title, transactions, file_name):
+    started_at = time.perf_counter()
+    rules_count = _write_prepared_file(transactions, file_name)
+    logger.info(f"Prepared {title} with {rules_count} association rules in {time.perf_counter() - started_at:.2f}s.")
+    return rules_count
+
+
+def _to_csv_atomically(df, file_name, **kwargs):
+    # We write to a temporary file first, so the app never reads a partially written file
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    df.to_csv(tmp_file_name, **kwargs)
+    os.replace(tmp_file_name, file_name)
+
+
+def _write_arrow_atomically(ar, metadata, file_name):
+    # Arrow keeps the Consequent lists as they are, so reading them needs no parsing
+    table = pa.Table.from_pandas(ar, schema=_association_rules_schema, preserve_index=False)
+    table = table.replace_schema_metadata({_metadata_key: json.dumps(metadata)})
+
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_file_name, compression="lz4")
+    os.replace(tmp_file_name, file_name)
+
+
+def _file_name(postfix=""):
+    # The association rules with the transactions statistics of the filter in one Arrow file
+    return os.path.join(Settings.prepared_data_path, f"{__name__}_{postfix}_market_basket.arrow")
+
+
+def _write_prepared_file(transactions, file_name):
+    ar, metadata = _mined_rules(transactions)
+    _write_arrow_atomically(ar, metadata, file_name)
+    return len(ar)
+
+
+def _mined_rules(transactions):
+    description_by_stock_code = transactions["description_by_stock_code"]
+    baskets = transactions["baskets"]
+
+    group_by_invoice_id = pd.DataFrame(
+        {
+            "Basket": np.arange(baskets.shape[0]),
+            "Total Cost": transactions["total_costs"],
+            "Basket Size": np.asarray(baskets.sum(axis=1)).ravel(),
+        }
+    )
+
+    # Reject outliers
+    group_by_invoice_id = reject_outliers_by_iqr(group_by_invoice_id, "Basket Size")
+
+    # transactions per basket size
+    trpbs = group_by_invoice_id.groupby("Basket Size", observed=True).agg({"Total Cost": "median", "Basket": "count"})
+    trpbs.loc[:, "Total Cost"] = trpbs.loc[:, "Total Cost"].round(2)
+    trpbs.rename(columns={"Total Cost": "Median Total Cost", "Basket": "Transactions"}, inplace=True)
+    # trpbs = group_by_invoice_id["Basket Size"].value_counts().sort_index(ascending=True)
+    # trpbs.name = "Transactions"
+
+    baskets = baskets[group_by_invoice_id["Basket"].to_numpy()]
+    transactions_count = baskets.shape[0]
+
+    # transactions stats and basket sizes are small, they are kept in the metadata of the rules file
+    metadata = {"transactions_count": transactions_count, "basket_sizes": trpbs.reset_index().to_dict("list")}
+
+    # Apriori works not well on low amount of transactions
+    if transactions_count <= 10:
+        return _associations_dataframe([]), metadata
+
+    logger.info(f"Analyzing {transactions_count} transactions.")
+    min_support = next(
+        (support for count, support in _min_support_below_transactions_count if transactions_count < count),
+        _min_support,
+    )
+
+    rules = association_rules(
+        baskets, transactions["items"], min_support=min_support, min_confidence=_min_confidence, min_lift=_min_lift
+    )
+    logger.info(f"Found association rules {len(rules)} total.")
+
+    def _clean_str(string):
+        string = string.strip()
+        string = re.sub(" +", " ", string)
+        return string
 
-        # Reject outliers
-        group_by_invoice_id = reject_outliers_by_iqr(group_by_invoice_id, "Basket Size")
+    # find baskets including all rule's stock codes by intersecting baskets of each stock code
+    transaction_ids = transaction_ids_by_item(baskets, transactions["items"])
+    basket_size_by_transaction = group_by_invoice_id["Basket Size"].to_numpy()
 
-        # write transactions per basket size
-        trpbs = group_by_invoice_id.groupby("Basket Size", observed=True).agg(
-            {"Total Cost": "median", "Invoice ID": "count"}
+    results = []
+    # rules have one item in the base, with maximal confidence of the items bought together
+    for antecedent_code, consequent_codes, support, confidence, lift in rules:
+        antecedent = _clean_str(description_by_stock_code[antecedent_code])
+        consequent = [_clean_str(description_by_stock_code[item]) for item in consequent_codes]
+
+        transactions_seen = int(support * transactions_count)
+
+        stock_codes = [antecedent_code, *consequent_codes]
+
+        # find statistics for baskets including all rule's stock codes
+        rule_transaction_ids = reduce(
+            lambda ids, stock_code: np.intersect1d(ids, transaction_ids[stock_code], assume_unique=True),
+            stock_codes[1:],
+            transaction_ids[stock_codes[0]],
         )
-        trpbs.loc[:, "Total Cost"] = trpbs.loc[:, "Total Cost"].round(2)
-        trpbs.rename(columns={"Total Cost": "Median Total Cost", "Invoice ID": "Transactions"}, inplace=True)
-        # trpbs = group_by_invoice_id["Basket Size"].value_counts().sort_index(ascending=True)
-        # trpbs.name = "Transactions"
-        trpbs.to_csv(basket_sizes_file, index=True)
-
-        transactions = list(group_by_invoice_id["Stock Code"])
-        transactions_count = len(transactions)
-
-        # write transactions stats
-        ts = pd.DataFrame([transactions_count], columns=["Transactions Count"])
-        ts.to_csv(transactions_stats_file, index=False)
-
-        # Apriori works not well on low amount of transactions
-        if transactions_count <= 10:
-            ar = _associations_dataframe([])
-            ar.to_csv(association_rules_file, index=False)
-            return 0
-
-        logger.info(f"Analyzing {transactions_count} transactions.")
-        # To prevent apriori running for too long and giving rubbish we use different minimum support for search
-        min_support = 0.01
-        if transactions_count < 10000:
-            min_support = 0.03
-        if transactions_count < 1000:
-            min_support = 0.1
-        if transactions_count < 100:
-            min_support = 0.2
-
-        relations_generator = apriori(
-            transactions, min_support=min_support, min_confidence=0.6, min_lift=3, min_length=2
+        basket_sizes = np.sort(basket_size_by_transaction[rule_transaction_ids]).tolist()
+        basket_size_min = basket_sizes[0]
+        basket_size_avg = int(round(sum(basket_sizes) / len(basket_sizes)))
+        basket_size_median = basket_sizes[len(basket_sizes) // 2]
+        basket_size_max = basket_sizes[-1]
+
+        rows = (
+            antecedent,
+            consequent,
+            support,
+            confidence,
+            lift,
+            transactions_seen,
+            basket_size_min,
+            basket_size_avg,
+            basket_size_median,
+            basket_size_max,
         )
-        relations = list(relations_generator)
-        logger.info(f"Found association rules {len(relations)} total.")
-
-        def _clean_str(string):
-            string = string.strip()
-            string = re.sub(" +", " ", string)
-            return string
-
-        results = []
-        for relation in relations:
-            # we take only rules with one item in the base
-            ordered_statistics_one_item_base = [
-                stat for stat in relation.ordered_statistics if len(stat.items_base) == 1
-            ]
-            if len(ordered_statistics_one_item_base) == 0:
-                continue
-
-            # we interested in rule with maximal confidence
-            confident_stat = max(ordered_statistics_one_item_base, key=lambda x: x.confidence)
-
-            antecedent = _clean_str(description_by_stock_code[list(confident_stat.items_base)[0]])
-            consequent = [_clean_str(description_by_stock_code[item]) for item in confident_stat.items_add]
-
-            support = relation.support
-            confidence = confident_stat.confidence
-            lift = confident_stat.lift
-            transactions_seen = int(support * transactions_count)
-
-            stock_codes = list(confident_stat.items_base) + list(confident_stat.items_add)
-
-            # find statistics for baskets including all rule's stock codes
-            basket_sizes = [
-                len(transaction)
-                for transaction in transactions
-                if all(stock_code in transaction for stock_code in stock_codes)
-            ]
-            basket_sizes.sort(reverse=False)
-            basket_size_min = min(basket_sizes)
-            basket_size_avg = int(round(sum(basket_sizes) / len(basket_sizes)))
-            basket_size_median = basket_sizes[len(basket_sizes) // 2]
-            basket_size_max = max(basket_sizes)
-
-            rows = (
-                antecedent,
-                consequent,
-                support,
-                confidence,
-                lift,
-                transactions_seen,
-                basket_size_min,
-                basket_size_avg,
-                basket_size_median,
-                basket_size_max,
-            )
-            results.append(rows)
-
-        ar = _associations_dataframe(results)
-        ar.sort_values("Consequent", ascending=True, inplace=True)
-        ar.to_csv(association_rules_file, index=False)
-
-        return len(ar)
+        results.append(rows)
+
+    ar = _associations_dataframe(results)
+    ar.sort_values("Consequent", ascending=True, inplace=True)
+
+    return ar, metadata
 
 
 def _associations_dataframe(results):
@@ -200,22 +287,36 @@ def maybe_initialize_session_state(st):
 def render(st, df, code_by_country):
     enable_sidebar_filters()
 
-    country, country_code, rejected_country, rejected_country_code = _initialize_sidebar_country_filter(
-        df, code_by_country
-    )
-    # read filtered data for specific country if any
-    ar, antecendent_items, consequent_counts, ts, trpbs = _read_csv_files(
-        *_file_names(country_filter_key("", country_code, rejected_country_code))
-    )
+    country, country_code, rejected_country, rejected_country_code = _initialize_sidebar_country_filter(code_by_country)
+    df, _filter_key, dates = date_range_filter(df)
+
+    # rules of all dates are prepared on deployment, rules of selected dates are mined on demand
+    rules, rules_job, is_rules_failed = None, None, False
+    if dates:
+        rules, rules_job, is_rules_failed = _rules_within_dates(df, country_code, rejected_country_code)
+    is_rules_within_dates = rules is not None
+    if rules is None:
+        # read filtered data for specific country if any
+        rules = _read_prepared_file(_file_name(country_filter_key("", country_code, rejected_country_code)))
+
+    ar, antecendent_items, consequent_counts, transactions_count, trpbs = rules
     antcendent_item, consequents_number = _initialize_rules_sidebar_filters(antecendent_items, consequent_counts)
     ar = _apply_sidebar_filters(ar, antcendent_item, consequents_number)
 
     st.title(
-        append_filters_title("Market Basket Analysis", None, country, rejected_country),
+        append_filters_title(
+            "Market Basket Analysis", dates if is_rules_within_dates else None, country, rejected_country
+        ),
         anchor="market-basket-analysis",
     )
+    rules_job_notice = st.empty()
+    if is_rules_failed:
+        _show_rules_failed_notice(rules_job_notice, dates)
 
-    st.markdown("We use Apriori algorithm to find associations rules between products.")
+    st.markdown(
+        "We use Eclat algorithm to find frequent items bought together and associations rules between them. "
+        "Rules of selected dates are found on demand."
+    )
 
     col1, col2 = st.columns(2)
 
@@ -247,7 +348,7 @@ def render(st, df, code_by_country):
             y="Transactions",
             nbins=30,
             title="Basket Size Distribution",
-            range_x=[1, max(trpbs["Basket Size"]) + 1],
+            range_x=[1, max(trpbs["Basket Size"], default=0) + 1],
         )
         fig.add_trace(Scatter(x=trpbs.index, y=trpbs["Median Total Cost"], name="Median Total Cost", yaxis="y2"))
         fig.update_layout(yaxis2=dict(title="Median Total Cost", overlaying="y", side="right"))
@@ -259,7 +360,7 @@ def render(st, df, code_by_country):
         "Filtered ",
         len(ar),
         " association rules found in ",
-        ts["Transactions Count"].values[0],
+        transactions_count,
         " transactions.",
     )
 
@@ -278,8 +379,65 @@ def render(st, df, code_by_country):
     with tab1:
         st.dataframe(ar, height=frame_height)
 
+    if rules_job:
+        _rerun_when_done(rules_job, rules_job_notice, dates)
+
+
+def _rules_within_dates(df, country_code, reject_country_code):
+    # Rules are mined in background, when they aren't mined within the time budget or mining fails,
+    # the page shows rules of all dates, and reruns once the job is done.
+    key = view_key(df)
+    if key is None:
+        return _mine_rules_within(df, country_code, reject_country_code), None, False
+
+    job = submit_job(
+        key + country_filter_key("", country_code, reject_country_code) + _mining_parameters_key(),
+        lambda: _mine_rules_within(df, country_code, reject_country_code),
+    )
+    wait([job], timeout=Settings.association_rules_time_budget)
+    if not job.done():
+        return None, job, False
+
+    if job.exception() is not None:
+        logger.error("Failed to find association rules on demand", exc_info=job.exception())
+        return None, None, True
+
+    return job.result(), None, False
 
-def _initialize_sidebar_country_filter(df, code_by_country):
+
+def _mine_rules_within(df, country_code, reject_country_code):
+    started_at = time.perf_counter()
+    df = filter_by_country_code(df, country_code, reject_country_code)
+    ar, metadata = _mined_rules(transactions_within(build_transaction_store(df)))
+    logger.info(f"Mined {len(ar)} association rules of {len(df)} rows in {time.perf_counter() - started_at:.2f}s.")
+    return _rules_tables(ar, metadata)
+
+
+def _rerun_when_done(job, notice, dates):
+    # the job's result is taken from the rerun, as the rules of all dates are already rendered
+    try:
+        wait_for_job(
+            job,
+            notice,
+            lambda seconds: f"Finding association rules from {dates[0]} to {dates[1]} for "
+            f"{Settings.association_rules_time_budget + seconds:.0f}s, rules of all dates are shown meanwhile.",
+        )
+    except Exception as e:
+        # the failed job is submitted again on the next rerun made by the user, not in a loop
+        logger.error("Failed to find association rules on demand", exc_info=e)
+        _show_rules_failed_notice(notice, dates)
+        return
+
+    st.rerun()
+
+
+def _show_rules_failed_notice(notice, dates):
+    notice.warning(
+        f"Failed to find association rules from {dates[0]} to {dates[1]}, rules of all dates are shown.", icon="⚠️"
+    )
+
+
+def _initialize_sidebar_country_filter(code_by_country):
     st.sidebar.subheader("🏠 Country Filter")
 
     rbc = pd.read_csv(_rules_count_by_country_filename).to_dict("list")
@@ -312,7 +470,6 @@ def _initialize_sidebar_country_filter(df, code_by_country):
 
     country_code = code_by_country[country]
     reject_code = uk_code if reject_uk and not country_code else None
-    df = do_filter_by_country_code(df, country_code, reject_code)
 
     logger.info(f"Country code: {country_code}")
 
@@ -327,10 +484,9 @@ def _initialize_sidebar_country_filter(df, code_by_country):
 
 def _initialize_rules_sidebar_filters(antecendent_items, consequent_counts):
     st.sidebar.subheader("🧃 Antecendent item")
-    antecendent_items.insert(0, "None")
     antcendent_item = st.sidebar.selectbox(
         "Select the item bought first, to see what were bought together or select None for all variants:",
-        antecendent_items,
+        ["None", *antecendent_items],
     )
 
     # We don't need this filter for now because all found rules has only 1 consequent item.
@@ -353,19 +509,29 @@ def _apply_sidebar_filters(ar, antecendent_item, consequents_number):
     return ar.sort_values(by="Confidence", ascending=False).reset_index(drop=True)
 
 
-def _read_csv_files(association_rules_file, transactions_stats_file, basket_sizes_file):
-    ar = pd.read_csv(association_rules_file)
-    ar["Consequent"] = ar["Consequent"].apply(ast.literal_eval)  # to parse string into list of strings
-    antecendent_items = list(ar["Antecedent"].unique())
-    antecendent_items.sort()
-    consequent_counts = list(ar["Consequent"].apply(len).unique())
-    consequent_counts.sort()
+def _read_prepared_file(file_name):
+    # the file is read once per its version, and shared across reruns and sessions
+    return _cached_prepared_file(file_name, os.path.getmtime(file_name))
+
+
+@st.cache_resource(max_entries=Settings.views_cache_max_entries)
+def _cached_prepared_file(file_name, updated_at):
+    table = feather.read_table(file_name)
+    metadata = json.loads(table.schema.metadata[_metadata_key])
+
+    ar = table.drop_columns(["Consequent"]).to_pandas()
+    ar.insert(1, "Consequent", table["Consequent"].to_pylist())
+
+    return _rules_tables(ar, metadata)
+
 
-    ts = pd.read_csv(transactions_stats_file)
+def _rules_tables(ar, metadata):
+    antecendent_items = sorted(ar["Antecedent"].unique())
+    consequent_counts = sorted(set(ar["Consequent"].map(len).tolist()))
 
-    trpbs = pd.read_csv(basket_sizes_file)
+    trpbs = pd.DataFrame(metadata["basket_sizes"])
 
-    return ar, antecendent_items, consequent_counts, ts, trpbs
+    return ar, antecendent_items, consequent_counts, metadata["transactions_count"], trpbs
 
 
 @st.cache_data
@@ -1,11 +1,182 @@
+from collections import OrderedDict
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
 from src.logger import logger
+from src.settings import Settings
+from src.single_flight import SingleFlight
+
+_event_by_counter = {"hits": "hit", "disk_hits": "disk hit", "misses": "miss", "evictions": "eviction"}
+
+
+class ReportsCache:
+    """Process-wide cache of reports shared by all sessions, bounded by the memory the reports take.
+
+    The least recently used reports are evicted when the reports take more than max_bytes,
+    and reports are evicted after ttl_seconds since they were cached. HTML reports are persisted to the path
+    as well, so they are read from disk instead of generated again after eviction or by other server processes.
+    Persisted reports are bounded by the same budget and time to live, counted since their last use.
+    Concurrent retrievals of the same missing report wait for one generation of it.
+    Hits, misses and evictions are counted and logged.
+
+    Parameters:
+        max_bytes (int): The memory budget of the cached reports.
+        ttl_seconds (float): The seconds a report is kept in memory for.
+        path (str, optional): The directory to persist HTML reports in, None to keep reports in memory only.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds, path=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.size_bytes = 0
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        # report, its size and the time it's cached at, by the report name in the least recently used order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+
+    def get(self, report_name, generator_fun):
+        """Retrieves the cached report by name if it's in memory or on disk, otherwise generates and caches it.
+
+        The report is generated outside of the lock, so other reports are retrieved meanwhile,
+        and concurrent retrievals of the same report share its generation.
+
+        Parameters:
+            report_name (str): The name of the report, including the dataset version and the filters.
+            generator_fun (function): A function that generates the report.
+
+        Returns:
+            The cached or generated report, shared by all sessions, so it should not be modified.
+        """
+
+        report = self._get_from_memory(report_name)
+        if report is not None:
+            return report
+
+        return self._single_flight.do(report_name, lambda: self._load(report_name, generator_fun))
+
+    def find(self, report_name):
+        """Retrieves the cached report by name if it's in memory or on disk, without generating it.
+
+        Parameters:
+            report_name (str): The name of the report, including the dataset version and the filters.
+
+        Returns:
+            The cached report, shared by all sessions, so it should not be modified, or None if it's not cached.
+        """
+
+        report = self._get_from_memory(report_name)
+        if report is not None:
+            return report
+
+        report = self._read(report_name)
+        if report is not None:
+            self._count("disk_hits", report_name)
+            with self._lock:
+                self._put(report_name, report)
+
+        return report
+
+    def contains(self, report_name):
+        """Tells whether the report is cached in memory or on disk, so retrieving it takes no generation."""
+
+        with self._lock:
+            self._evict_expired()
+            if report_name in self._entries:
+                return True
+
+        return self.path is not None and os.path.isfile(_report_file_name(self.path, report_name))
+
+    def _get_from_memory(self, report_name):
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(report_name)
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(report_name)
+            self._count("hits", report_name)
+            return entry[0]
+
+    def _load(self, report_name, generator_fun):
+        # the report could be cached by the call that was in flight with the same name
+        with self._lock:
+            entry = self._entries.get(report_name)
+            if entry is not None:
+                self._count("hits", report_name)
+                return entry[0]
+
+        report = self._read(report_name)
+        if report is not None:
+            self._count("disk_hits", report_name)
+        else:
+            self._count("misses", report_name)
+            report = generator_fun()
+            self._persist(report_name, report)
+
+        with self._lock:
+            self._put(report_name, report)
+
+        return report
+
+    def _put(self, report_name, report):
+        size = _size_of(report)
+        if report_name in self._entries:
+            self.size_bytes -= self._entries.pop(report_name)[1]
+
+        # reports larger than the whole budget are never kept in memory
+        if size > self.max_bytes:
+            return
+
+        self._entries[report_name] = (report, size, time.monotonic())
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict_expired(self):
+        expired_before = time.monotonic() - self.ttl_seconds
+        # entries are in the least recently used order, so the expired ones can be anywhere
+        for report_name in [name for name, entry in self._entries.items() if entry[2] <= expired_before]:
+            self._evict(report_name)
+
+    def _evict(self, report_name):
+        self.size_bytes -= self._entries.pop(report_name)[1]
+        self._count("evictions", report_name)
+
+    def _count(self, counter, report_name):
+        self.counters[counter] += 1
+        logger.info(
+            f'Reports cache {_event_by_counter[counter]} for "{report_name}" key, '
+            f"{self.counters}, {self.size_bytes / 1024**2:.1f} of {self.max_bytes / 1024**2:.1f} MiB"
+        )
+
+    def _read(self, report_name):
+        if self.path is None:
+            return None
+
+        return read_persisted_report(report_name, self.path)
+
+    def _persist(self, report_name, report):
+        # only HTML reports are persisted
+        if self.path is not None and isinstance(report, str):
+            persist_report(report_name, report, self.path, self.max_bytes, self.ttl_seconds)
+
 
+_reports_cache = ReportsCache(
+    Settings.reports_cache_max_bytes, Settings.reports_cache_ttl_seconds, Settings.reports_path
+)
 
-def get_cached_report(session_state, report_name, generator_fun):
+
+def get_cached_report(report_name, generator_fun):
     """Retrieves a cached report by name if it exists, otherwise generates and caches the report globally.
 
     Args:
-        session_state: A streamlit SessionState dict like object to st.
         report_name (str): The name of the report.
         generator_fun (function): A function that generates the report.
 
@@ -13,20 +184,133 @@ def get_cached_report(session_state, report_name, generator_fun):
         The cached report if it exists, otherwise the generated report.
 
     """
-    key = _session_state_key(report_name)
-
-    if key in session_state:
-        logger.info(f'Using cached report for "{key}" key')
-        return session_state[key]
-    else:
-        logger.info(f'Generating report for "{key}" key')
-        report = session_state[key] = generator_fun()
-        return report
 
+    return _reports_cache.get(report_name, generator_fun)
+
+
+def find_cached_report(report_name):
+    """Retrieves a cached report by name without generating it.
+
+    Args:
+        report_name (str): The name of the report.
+
+    Returns:
+        The cached report, or None if it's not cached.
+    """
+
+    return _reports_cache.find(report_name)
+
+
+def read_persisted_report(report_key, path=Settings.reports_path):
+    """Reads the HTML of the report persisted by any server process.
+
+    Args:
+        report_key (str): The key of the report, including the dataset version and the filters.
+        path (str, optional): The directory of persisted reports. Defaults to Settings.reports_path.
+
+    Returns:
+        str: The HTML of the report, or None if it's not persisted yet.
+    """
+
+    file_name = _report_file_name(path, report_key)
+    try:
+        with open(file_name, encoding="utf-8") as file:
+            html = file.read()
+    except FileNotFoundError:
+        # the report is not persisted yet, or pruned by another server process
+        return None
+
+    # the modification time tells the last use of the report to prune_persisted_reports
+    os.utime(file_name)
+    logger.info(f'Read persisted report for "{report_key}" key from {file_name}')
+    return html
+
+
+def persist_report(
+    report_key,
+    html,
+    path=Settings.reports_path,
+    max_bytes=Settings.reports_cache_max_bytes,
+    ttl_seconds=Settings.reports_cache_ttl_seconds,
+):
+    """Persists the HTML of the report on disk, to share it with all server processes,
+    and prunes the other persisted reports with prune_persisted_reports.
+
+    Args:
+        report_key (str): The key of the report, including the dataset version and the filters.
+        html (str): The HTML of the report.
+        path (str, optional): The directory of persisted reports. Defaults to Settings.reports_path.
+        max_bytes (int, optional): The disk budget of persisted reports.
+            Defaults to Settings.reports_cache_max_bytes.
+        ttl_seconds (float, optional): The seconds an unused report is kept on disk for.
+            Defaults to Settings.reports_cache_ttl_seconds.
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    # We write to a temporary file first, so concurrent readers never see a partially written file
+    file_name = _report_file_name(path, report_key)
+    tmp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    with open(tmp_file_name, "w", encoding="utf-8") as file:
+        file.write(html)
+    os.replace(tmp_file_name, file_name)
+
+    logger.info(f'Persisted report for "{report_key}" key to {file_name}')
+
+    prune_persisted_reports(path, max_bytes, ttl_seconds, keep_file_name=file_name)
+
+
+def prune_persisted_reports(path, max_bytes, ttl_seconds, keep_file_name=None):
+    """Deletes the persisted reports not used for ttl_seconds, like the reports of previous dataset versions,
+    then the least recently used ones while the reports take more than max_bytes on disk.
+
+    Args:
+        path (str): The directory of persisted reports.
+        max_bytes (int): The disk budget of persisted reports.
+        ttl_seconds (float): The seconds an unused report is kept on disk for.
+        keep_file_name (str, optional): The file not to delete, like the just persisted report.
+    """
+
+    files = []
+    size_bytes = 0
+    for entry in os.scandir(path):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            # pruned by another server process
+            continue
+
+        size_bytes += stat.st_size
+        if entry.path != keep_file_name:
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    expired_before = time.time() - ttl_seconds
+    deleted_count = 0
+    for used_at, size, file_name in sorted(files):
+        is_expired = used_at <= expired_before
+        # temporary files can be written by other server processes at the moment, so only the expired ones go
+        if not is_expired and (size_bytes <= max_bytes or file_name.endswith(".tmp")):
+            continue
+
+        try:
+            os.remove(file_name)
+        except FileNotFoundError:
+            pass
+
+        size_bytes -= size
+        deleted_count += 1
+
+    if deleted_count:
+        logger.info(f"Pruned {deleted_count} persisted reports, {size_bytes / 1024**2:.1f} MiB left in {path}")
+
+
+def _report_file_name(path, report_key):
+    # keys have dates and other characters, that are not safe for file names
+    return os.path.join(path, f"report_{hashlib.sha256(report_key.encode()).hexdigest()}.html")
 
-def is_report_cached(session_state, report_name):
-    return bool(session_state.get(_session_state_key(report_name)))
 
+def _size_of(report):
+    if isinstance(report, pd.DataFrame):
+        return int(report.memory_usage(deep=True).sum())
 
-def _session_state_key(report_name):
-    return "get_cached_report_" + report_name
+    return sys.getsizeof(report)
@@ -14,14 +14,37 @@ class Settings:
     # Loaded from environment variables
 
     port: int = int(os.environ["STREAMLIT_SERVER_PORT"])
+    # processes preparing data on disk during the deployment, all CPU cores by default
+    prepare_data_workers: int = int(os.environ.get("PREPARE_DATA_WORKERS", os.cpu_count() or 1))
 
     # Hardcoded
 
     dataset_csv_path: str = "dataset/online_retail_II.csv"
+    dataset_chunksize: int = 100_000
+    # relative error of Total Cost quantiles to find outliers with, None for exact quantiles
+    outliers_sketch_relative_accuracy: float | None = None
+    # filtered views and tables derived from them, shared by all sessions
+    views_cache_max_entries: int = 16
+    # K-Means is fitted on a sample of customers, when there are more of them than this
+    k_means_exact_max_samples: int = 200_000
+    k_means_sample_size: int = 50_000
+    # centroids of the last fits to warm start K-Means from, by the dataset version, countries and segments count
+    k_means_warm_starts_max_entries: int = 64
+    # "eclat" or "apriori", the engine to find frequent items bought together for market basket analysis
+    association_rules_engine: str = "eclat"
+    # seconds to wait for association rules mined on demand for selected dates, before showing rules of all dates
+    association_rules_time_budget: float = 3.0
+    # threads running jobs in background of the page scripts, shared by all sessions
+    background_jobs_workers: int = 2
     plot_integer_format: str = ",d"
     plot_currency_format: str = "$,r"
     text_integer_format: str = "{:,d}"
     prepared_data_path: str = "./prepared_data"
+    # HTML reports generated at run time, shared by all server processes, None to keep reports in memory only
+    reports_path: str | None = "./prepared_data/reports"
+    # reports kept in memory of the server process, the least recently used are evicted beyond the budget
+    reports_cache_max_bytes: int = 256 * 1024**2
+    reports_cache_ttl_seconds: float = 24 * 60 * 60
 
     # From pyproject.toml
 
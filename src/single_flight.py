@@ -0,0 +1,65 @@
+from concurrent.futures import Future
+import threading
+
+from src.logger import logger
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call, whose result all callers share.
+
+    Nothing is cached, the call made after the in-flight one is done calls the function again.
+    When the in-flight call raises an error, the waiting callers raise the same error.
+    When the call is interrupted, like when streamlit stops the script of its session,
+    one of the waiting callers calls the function again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # the future of the in-flight call by its key
+        self._calls = {}
+
+    def do(self, key, fun):
+        """Calls the function, or waits for the in-flight call with the same key and returns its result.
+
+        Parameters:
+            key (str): The key of the call and its parameters.
+            fun (function): A function without arguments doing the call.
+
+        Returns:
+            The result of the function, shared by all concurrent callers, so it should not be modified.
+        """
+
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = Future()
+                    break
+
+            logger.info(f'Waiting for in-flight call for "{key}" key')
+            if call.result() is not _interrupted:
+                return call.result()
+
+        # the call is forgotten before its result is set, so callers woken by an interrupted call make a new one
+        try:
+            result = fun()
+        except Exception as e:
+            self._forget(key)
+            call.set_exception(e)
+            raise
+        except BaseException:
+            self._forget(key)
+            call.set_result(_interrupted)
+            raise
+
+        self._forget(key)
+        call.set_result(result)
+        return result
+
+    def _forget(self, key):
+        with self._lock:
+            del self._calls[key]
+
+
+# The result of the call interrupted by a control flow exception, that is not an error of the call
+_interrupted = object()
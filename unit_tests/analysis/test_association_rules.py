@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.analysis.association_rules import (
+    association_rules,
+    encode_baskets,
+    frequent_itemsets,
+    transaction_ids_by_item,
+)
+
+
+def _random_baskets():
+    rng = np.random.default_rng(42)
+    items = [f"item{index}" for index in range(30)]
+    # skewed popularity gives itemsets of several lengths, items may repeat within a transaction
+    weights = 1 / np.arange(1, len(items) + 1)
+    return encode_baskets(
+        [rng.choice(items, size=rng.integers(1, 12), p=weights / weights.sum()).tolist() for _ in range(300)]
+    )
+
+
+def test_encode_baskets_pass_when_counts_sorted_items_of_each_transaction():
+    baskets, items = encode_baskets([["B", "A", "B"], ["C"]])
+
+    assert items.tolist() == ["A", "B", "C"]
+    assert baskets.toarray().tolist() == [[1, 2, 0], [0, 0, 1]]
+
+
+def test_association_rules_pass_when_returns_rules_with_most_confident_one_item_antecedent():
+    baskets, items = encode_baskets([["A", "B"], ["A", "B"], ["A", "B", "C"], ["C"], ["C", "D"], ["D"]])
+
+    rules = association_rules(baskets, items, min_support=0.3, min_confidence=0.6, min_lift=1.5)
+
+    assert rules == [("A", ("B",), 0.5, 1.0, 2.0)]
+
+
+def test_frequent_itemsets_pass_when_eclat_finds_same_itemsets_as_apriori():
+    baskets, items = _random_baskets()
+
+    eclat_supports = frequent_itemsets(baskets, items, min_support=0.05, engine="eclat")
+
+    assert max(len(itemset) for itemset in eclat_supports) > 2
+    assert eclat_supports == frequent_itemsets(baskets, items, min_support=0.05, engine="apriori")
+
+
+@pytest.mark.parametrize("min_support", [0.03, 0.1])
+def test_association_rules_pass_when_eclat_finds_same_rules_as_apriori(min_support):
+    baskets, items = _random_baskets()
+
+    rules = association_rules(baskets, items, min_support, min_confidence=0.3, min_lift=1.1, engine="eclat")
+
+    assert rules
+    assert sorted(rules) == sorted(
+        association_rules(baskets, items, min_support, min_confidence=0.3, min_lift=1.1, engine="apriori")
+    )
+
+
+def test_transaction_ids_by_item_pass_when_returns_sorted_distinct_transactions_of_each_item():
+    baskets, items = encode_baskets([["B", "A", "B"], ["C"], ["A", "C"]])
+
+    index = transaction_ids_by_item(baskets, items)
+
+    assert list(index.keys()) == ["A", "B", "C"]
+    assert [ids.tolist() for ids in index.values()] == [[0, 2], [0], [1, 2]]
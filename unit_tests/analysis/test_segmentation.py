@@ -1,6 +1,22 @@
+import datetime
+
+import numpy as np
 import pandas as pd
+import pytest
+from sklearn.metrics import adjusted_rand_score
 
-from src.analysis.segmentation import k_means_centroids, rfm_scores, summarize_segments
+from src.analysis import segmentation as segmentation_module
+from src.analysis.segmentation import (
+    assign_segments,
+    k_means_centroids,
+    k_means_segmentations,
+    rfm_prefix_aggregates,
+    rfm_scores,
+    rfm_scores_within,
+    summarize_segments,
+)
+from src.dataframe.preprocess import do_prepare_dataframe
+from src.settings import Settings
 from unit_tests.conftest import build_dataframe
 
 
@@ -24,6 +40,43 @@ def test_rfm_scores_pass_when_returns_recency_frequency_and_monetary_statistics(
     assert scores.equals(expected_stats)
 
 
+def test_rfm_scores_pass_when_returns_same_statistics_as_calculated_per_customer_for_prepared_dataframe():
+    df = build_dataframe(100)
+    snapshot_date = df["Invoice Date"].max()
+    by_customer = df.groupby("Customer ID")
+
+    scores = rfm_scores(df)
+
+    assert scores["Customer ID"].to_list() == sorted(df["Customer ID"].unique())
+    recencies = [(snapshot_date - dates.max()).days for _, dates in by_customer["Invoice Date"]]
+    assert scores["Recency"].to_list() == recencies
+    assert scores["Frequency"].to_list() == [ids.nunique() for _, ids in by_customer["Invoice ID"]]
+    assert scores["Monetary"].to_list() == pytest.approx([costs.sum() for _, costs in by_customer["Total Cost"]])
+
+
+def test_rfm_scores_within_pass_when_returns_same_statistics_as_rfm_scores_of_filtered_transactions():
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    # a purchase at the midnight of the last date is within the date range filter, the later one is not
+    df["Invoice ID"] = df["Invoice ID"].cat.add_categories(["900001", "900002"])
+    df.loc[df.index[-2], ["Invoice ID", "Invoice Date"]] = ["900001", pd.Timestamp("2009-12-02 00:00:00")]
+    df.loc[df.index[-1], ["Invoice ID", "Invoice Date"]] = ["900002", pd.Timestamp("2009-12-02 10:00:00")]
+    uk_code = code_by_country["United Kingdom"]
+    dates = (datetime.date(2009, 12, 1), datetime.date(2009, 12, 2))
+    in_dates = df[df["Invoice Date"] <= pd.Timestamp("2009-12-02")]
+
+    aggregates = rfm_prefix_aggregates(df)
+
+    pd.testing.assert_frame_equal(rfm_scores_within(aggregates), rfm_scores(df))
+    pd.testing.assert_frame_equal(rfm_scores_within(aggregates, dates), rfm_scores(in_dates))
+    pd.testing.assert_frame_equal(
+        rfm_scores_within(aggregates, dates, uk_code, None), rfm_scores(in_dates[in_dates["Country"] == uk_code])
+    )
+    pd.testing.assert_frame_equal(
+        rfm_scores_within(aggregates, None, None, uk_code), rfm_scores(df[df["Country"] != uk_code])
+    )
+    assert rfm_scores_within(aggregates, (datetime.date(2010, 1, 1), datetime.date(2010, 2, 1))).empty
+
+
 def test_label_k_means_centroids_pass_when_returns_labeled_data_with_important_features():
     rfm_scores = pd.DataFrame(
         columns=["Customer ID", "Recency", "Frequency", "Monetary"],
@@ -42,6 +95,75 @@ def test_label_k_means_centroids_pass_when_returns_labeled_data_with_important_f
     assert list(importances.keys()) == [1, 2]
     assert isinstance(importances[1], list)
     assert isinstance(importances[2], list)
+    # features are ranked by the absolute value of the standardized centroid
+    assert [feature for feature, _weight in importances[2]] == ["Frequency", "Recency", "Monetary", "Customer ID"]
+    weights = [weight for _feature, weight in importances[2]]
+    assert weights == pytest.approx([1.4142136, 1.3739219, 1.3183756, 1.0690450])
+
+
+def _separated_rfm_scores():
+    rng = np.random.default_rng(42)
+    centers = np.repeat([[300, 1, 100], [30, 10, 2_000], [5, 50, 20_000]], 1_000, axis=0)
+    return pd.DataFrame(centers * rng.normal(1, 0.1, size=centers.shape), columns=["Recency", "Frequency", "Monetary"])
+
+
+def test_k_means_centroids_pass_when_fit_on_sample_segments_same_as_exact_fit():
+    rfm_scores = _separated_rfm_scores()
+
+    exact_df, _importances = k_means_centroids(rfm_scores, n_clusters=3)
+    sampled_df, importances = k_means_centroids(rfm_scores, n_clusters=3, exact_max_samples=1_000, sample_size=300)
+    resampled_df, _importances = k_means_centroids(rfm_scores, n_clusters=3, exact_max_samples=1_000, sample_size=300)
+
+    assert adjusted_rand_score(exact_df["Segment ID"], sampled_df["Segment ID"]) > 0.99
+    assert list(importances.keys()) == [1, 2, 3]
+    # segments are stable between fits
+    pd.testing.assert_frame_equal(sampled_df, resampled_df)
+
+
+def test_k_means_segmentations_pass_when_fits_each_segments_count_same_as_k_means_centroids():
+    scores = rfm_scores(build_dataframe(100))
+
+    segmentations = k_means_segmentations(scores, [2, 3])
+
+    assert list(segmentations.keys()) == [2, 3]
+    for n_clusters, segmentation in segmentations.items():
+        segments, importances = k_means_centroids(scores, n_clusters=n_clusters)
+        pd.testing.assert_frame_equal(segmentation["segments"], segments)
+        assert segmentation["features_importance"].keys() == importances.keys()
+        assert segmentation["inertia"] > 0
+        assert -1 <= segmentation["silhouette"] <= 1
+    assert segmentations[3]["inertia"] < segmentations[2]["inertia"]
+
+
+def test_k_means_segmentations_pass_when_warm_started_from_previous_fit_keeps_segment_ids():
+    rfm_scores = _separated_rfm_scores()
+    # the shuffled subset of customers would get other initial centroids when fitted from scratch
+    subset = rfm_scores.sample(frac=0.8, random_state=1)
+
+    segments = k_means_segmentations(rfm_scores, [3], warm_start_key="test_warm_start")[3]["segments"]
+    subset_segments = k_means_segmentations(subset, [3], warm_start_key="test_warm_start")[3]["segments"]
+
+    pd.testing.assert_series_equal(subset_segments["Segment ID"], segments.loc[subset.index, "Segment ID"])
+
+
+def test_k_means_segmentations_pass_when_forgets_least_recently_fitted_warm_starts(monkeypatch):
+    monkeypatch.setattr(Settings, "k_means_warm_starts_max_entries", 2)
+    rfm_scores = _separated_rfm_scores()
+
+    for warm_start_key in ["test_forget_1", "test_forget_2", "test_forget_3"]:
+        k_means_segmentations(rfm_scores, [3], warm_start_key=warm_start_key)
+
+    assert list(segmentation_module._warm_start_centroids) == [("test_forget_2", 3), ("test_forget_3", 3)]
+
+
+def test_assign_segments_pass_when_assigns_same_segments_as_fitted_by_k_means_segmentations():
+    scores = rfm_scores(build_dataframe(100))
+
+    segmentation = k_means_segmentations(scores, [3])[3]
+
+    np.testing.assert_array_equal(
+        assign_segments(segmentation["model"], scores), segmentation["segments"]["Segment ID"].to_numpy()
+    )
 
 
 def test_summarize_segments_passes_when_returns_mean_values_by_segment():
@@ -0,0 +1,17 @@
+from src.analysis.segmentation import k_means_segmentations, rfm_scores
+from src.analysis.segmentation_model import (
+    read_segmentation_model,
+    segmentation_model_file_name,
+    write_segmentation_model,
+)
+from unit_tests.conftest import build_dataframe
+
+
+def test_read_segmentation_model_pass_when_returns_same_model_as_written(tmp_path):
+    model = k_means_segmentations(rfm_scores(build_dataframe(100)), [3])[3]["model"]
+    file_name = segmentation_model_file_name(tmp_path / "prepared_data", 3)
+
+    write_segmentation_model(file_name, model)
+
+    assert read_segmentation_model(file_name) == model
+    assert [path.name for path in (tmp_path / "prepared_data").iterdir()] == ["segmentation_model_3.json"]
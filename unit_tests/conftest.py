@@ -7,7 +7,7 @@ from src.dataframe.preprocess import do_prepare_dataframe
 
 def build_dataframe(rows_count: int = 100):
     """Returns a dataframe with N rows"""
-    df, _ = do_prepare_dataframe("dataset/online_retail_II_100.csv")
+    df, _ = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
 
     while len(df) < rows_count:
         df = pd.concat([df, df])
@@ -0,0 +1,55 @@
+import datetime
+
+import pandas as pd
+
+from src.dataframe.daily_cube import build_daily_country_cube, customers_by_country, revenue_by_country
+from src.dataframe.preprocess import decode_countries, do_prepare_dataframe
+
+
+def _prepared_dataframe():
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    # rows at the midnight of the last date are within the date range filter, the rest of the day is not
+    df.loc[df.index[-2], "Invoice Date"] = pd.Timestamp("2009-12-02 00:00:00")
+    df.loc[df.index[-1], "Invoice Date"] = pd.Timestamp("2009-12-02 10:00:00")
+    return df, code_by_country
+
+
+def _expected_table(df, code_by_country, column, aggregation, values_column, country=None):
+    if country:
+        df = df[df["Country"] == code_by_country[country]]
+
+    df = decode_countries(df[["Country", column]].copy(), code_by_country)
+    table = df.groupby("Country", observed=True).agg({column: aggregation}).reset_index()
+    return table.rename(columns={column: values_column})
+
+
+def test_customers_by_country_pass_when_counts_same_customers_as_filtered_rows():
+    df, code_by_country = _prepared_dataframe()
+    cube = build_daily_country_cube(df)
+    dates = (datetime.date(2009, 12, 1), datetime.date(2009, 12, 2))
+
+    customers = customers_by_country(cube, code_by_country, dates)
+    france_customers = customers_by_country(cube, code_by_country, dates, None, code_by_country["United Kingdom"])
+
+    filtered_df = df[df["Invoice Date"] <= pd.Timestamp("2009-12-02")]
+    expected = _expected_table(filtered_df, code_by_country, "Customer ID", "nunique", "Customers count")
+    expected_france = _expected_table(
+        filtered_df, code_by_country, "Customer ID", "nunique", "Customers count", "France"
+    )
+    pd.testing.assert_frame_equal(customers, expected)
+    pd.testing.assert_frame_equal(france_customers, expected_france)
+
+
+def test_revenue_by_country_pass_when_sums_same_revenue_as_filtered_rows():
+    df, code_by_country = _prepared_dataframe()
+    cube = build_daily_country_cube(df)
+    dates = (datetime.date(2009, 12, 1), datetime.date(2009, 12, 2))
+
+    revenue = revenue_by_country(cube, code_by_country, dates, code_by_country["France"], None)
+    all_revenue = revenue_by_country(cube, code_by_country)
+
+    filtered_df = df[df["Invoice Date"] <= pd.Timestamp("2009-12-02")]
+    expected = _expected_table(filtered_df, code_by_country, "Total Cost", "sum", "Revenue", "France")
+    pd.testing.assert_frame_equal(revenue, expected)
+    expected_all = _expected_table(df, code_by_country, "Total Cost", "sum", "Revenue")
+    pd.testing.assert_frame_equal(all_revenue, expected_all)
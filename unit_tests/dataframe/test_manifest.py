@@ -0,0 +1,55 @@
+import os
+
+from src.dataframe.manifest import (
+    artifact_fingerprint,
+    country_fingerprints,
+    is_up_to_date,
+    read_manifest,
+    record_artifact,
+    write_manifest,
+)
+from src.dataframe.preprocess import do_prepare_dataframe
+
+
+def test_country_fingerprints_pass_when_only_changed_country_fingerprint_changes():
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    uk_code = code_by_country["United Kingdom"]
+
+    fingerprints = country_fingerprints(df, code_by_country)
+    changed = df.copy()
+    changed.loc[changed.index[changed["Country"] == uk_code][0], "Quantity"] += 1
+    changed_fingerprints = country_fingerprints(changed, code_by_country)
+
+    assert fingerprints == country_fingerprints(df.copy(), code_by_country)
+    assert changed_fingerprints["United Kingdom"] != fingerprints["United Kingdom"]
+    assert {name: value for name, value in changed_fingerprints.items() if name != "United Kingdom"} == {
+        name: value for name, value in fingerprints.items() if name != "United Kingdom"
+    }
+
+
+def test_artifact_fingerprint_pass_when_independent_of_inputs_order():
+    assert artifact_fingerprint(a=1, b={"x": 1, "y": 2}) == artifact_fingerprint(b={"y": 2, "x": 1}, a=1)
+    assert artifact_fingerprint(a=1) != artifact_fingerprint(a=2)
+
+
+def test_manifest_pass_when_artifact_is_up_to_date_after_reading_written_manifest(tmp_path):
+    file_name = os.path.join(tmp_path, "artifact.arrow")
+    manifest = read_manifest(tmp_path)
+    assert manifest == {}
+
+    record_artifact(manifest, file_name, "fingerprint")
+    write_manifest(tmp_path, manifest)
+    manifest = read_manifest(tmp_path)
+
+    # the artifact file must exist too
+    assert not is_up_to_date(manifest, file_name, "fingerprint")
+    open(file_name, "w").close()
+    assert is_up_to_date(manifest, file_name, "fingerprint")
+    assert not is_up_to_date(manifest, file_name, "other fingerprint")
+
+
+def test_read_manifest_pass_when_returns_empty_manifest_for_invalid_file(tmp_path):
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as file:
+        file.write("{invalid")
+
+    assert read_manifest(tmp_path) == {}
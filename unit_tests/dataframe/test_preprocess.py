@@ -1,22 +1,103 @@
+import shutil
+
 import pandas as pd
 from pandas.api import types
 
-from src.dataframe.preprocess import cast_column_types, decode_countries, encode_countries, reject_outliers_by_iqr
+from src.dataframe.preprocess import (
+    cast_column_types,
+    decode_countries,
+    do_prepare_dataframe,
+    encode_countries,
+    reject_outliers_by_iqr,
+)
+from src.dataframe.quantile_sketch import QuantileSketch
 from unit_tests.conftest import build_dataframe
 
 
+def test_do_prepare_dataframe_pass_when_loads_same_dataframe_from_cache(tmp_path):
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=tmp_path)
+    cached_df, cached_code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=tmp_path)
+
+    assert len(list(tmp_path.iterdir())) == 1
+    pd.testing.assert_frame_equal(cached_df, df)
+    assert cached_code_by_country == code_by_country
+
+
+def test_do_prepare_dataframe_pass_when_merges_rows_appended_to_source_file_into_cache(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    cache_path = tmp_path / "cache"
+    shutil.copy("dataset/online_retail_II_100.csv", csv_path)
+    do_prepare_dataframe(csv_path, cache_path=cache_path)
+
+    with open(csv_path, "a") as file:
+        # duplicate of the first row, the row of the new country, and the row of the United Kingdom
+        file.write("\n489434,85048,15CM CHRISTMAS GLASS BALL 20 LIGHTS,12,2009-12-01 07:45:00,6.95,13085.0,")
+        file.write("United Kingdom")
+        file.write("\n489443,22350,CAT BOWL ,12,2009-12-01 10:01:00,2.55,12346.0,Iceland")
+        file.write("\n489444,22349,DOG BOWL ,6,2009-12-01 10:04:00,3.75,13085.0,United Kingdom\n")
+    df, code_by_country = do_prepare_dataframe(csv_path, cache_path=cache_path)
+    expected_df, expected_code_by_country = do_prepare_dataframe(csv_path, cache_path=None)
+
+    pd.testing.assert_frame_equal(df, expected_df)
+    assert code_by_country == expected_code_by_country
+
+
+def test_do_prepare_dataframe_pass_when_prepares_whole_source_file_on_change_of_its_rows(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    cache_path = tmp_path / "cache"
+    shutil.copy("dataset/online_retail_II_100.csv", csv_path)
+    do_prepare_dataframe(csv_path, cache_path=cache_path)
+
+    with open(csv_path, "r+") as file:
+        content = file.read().replace("15CM CHRISTMAS GLASS BALL", "15CM XMAS GLASS BALL")
+        file.seek(0)
+        file.write(content)
+        file.truncate()
+    df, _code_by_country = do_prepare_dataframe(csv_path, cache_path=cache_path)
+
+    assert "15CM XMAS GLASS BALL 20 LIGHTS" in df["Stock Description"].values
+    assert "15CM CHRISTMAS GLASS BALL 20 LIGHTS" not in df["Stock Description"].values
+
+
+def test_do_prepare_dataframe_pass_when_reading_by_chunks_gives_same_dataframe_as_reading_whole_file(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    shutil.copy("dataset/online_retail_II_100.csv", csv_path)
+    # duplicate of the first row to be rejected across chunks
+    with open(csv_path, "a") as file:
+        file.write("\n489434,85048,15CM CHRISTMAS GLASS BALL 20 LIGHTS,12,2009-12-01 07:45:00,6.95,13085.0,")
+        file.write("United Kingdom")
+
+    df, code_by_country = do_prepare_dataframe(csv_path, cache_path=None, chunksize=None)
+    chunked_df, chunked_code_by_country = do_prepare_dataframe(csv_path, cache_path=None, chunksize=7)
+
+    pd.testing.assert_frame_equal(chunked_df, df)
+    assert chunked_code_by_country == code_by_country
+    assert ((df["Invoice ID"] == "489434") & (df["Stock Code"] == "85048")).sum() == 1
+
+
 def test_cast_column_types_pass_when_return_columns_with_appropriate_types():
     df = build_dataframe()
+    df = df.astype(
+        {
+            "Invoice ID": "object",
+            "Stock Code": "object",
+            "Stock Description": "object",
+            "Quantity": "int64",
+            "Customer ID": "float64",
+            "Country": "int64",
+        }
+    )
+    df["Invoice Date"] = df["Invoice Date"].dt.strftime("%Y-%m-%d %H:%M:%S")
 
     df = cast_column_types(df)
 
     assert isinstance(df["Invoice ID"].dtype, pd.CategoricalDtype)
     assert isinstance(df["Stock Code"].dtype, pd.CategoricalDtype)
-    assert isinstance(df["Stock Description"].dtype, pd.StringDtype)
-    assert isinstance(df["Quantity"].dtype, pd.Int64Dtype)
+    assert df["Stock Description"].dtype == pd.StringDtype("pyarrow")
+    assert df["Quantity"].dtype == "int32"
     assert types.is_datetime64_dtype(df["Invoice Date"].dtype)
-    assert isinstance(df["Price"].dtype, pd.Float64Dtype)
-    assert isinstance(df["Customer ID"].dtype, pd.Float64Dtype)  # manually casted
+    assert df["Price"].dtype == "float64"
+    assert df["Customer ID"].dtype == "int32"  # manually casted
     assert isinstance(df["Country"].dtype, pd.CategoricalDtype)
 
 
@@ -90,3 +171,28 @@ def test_reject_outliers_by_iqr_pass_when_removes_outliers():
     df = reject_outliers_by_iqr(df, "Quantity")
 
     assert df["Quantity"].tolist() == [1, 2, 3, 4, 6, 8, 9, 10]
+
+
+def test_reject_outliers_by_iqr_pass_when_removes_outliers_by_sketch_quartiles():
+    df = build_dataframe(10)
+    df["Quantity"] = [1, 2, 3, 4, 500, 6, 20, 8, 9, 10]
+
+    df = reject_outliers_by_iqr(df, "Quantity", sketch=QuantileSketch(0.01).update(df["Quantity"]))
+
+    assert df["Quantity"].tolist() == [1, 2, 3, 4, 6, 8, 9, 10]
+
+
+def test_do_prepare_dataframe_pass_when_sketch_of_appended_rows_merges_into_cache(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    cache_path = tmp_path / "cache"
+    shutil.copy("dataset/online_retail_II_100.csv", csv_path)
+    do_prepare_dataframe(csv_path, cache_path=cache_path, sketch_relative_accuracy=0.01)
+
+    with open(csv_path, "a") as file:
+        file.write("\n489443,22350,CAT BOWL ,12,2009-12-01 10:01:00,2.55,12346.0,Iceland\n")
+    df, _code_by_country = do_prepare_dataframe(csv_path, cache_path=cache_path, sketch_relative_accuracy=0.01)
+    expected_df, _expected_code_by_country = do_prepare_dataframe(
+        csv_path, cache_path=None, sketch_relative_accuracy=0.01
+    )
+
+    pd.testing.assert_frame_equal(df, expected_df)
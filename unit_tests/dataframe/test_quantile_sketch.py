@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from src.dataframe.quantile_sketch import QuantileSketch
+
+
+def test_quantile_pass_when_estimates_quantiles_within_relative_accuracy():
+    values = np.random.default_rng(42).lognormal(mean=2, sigma=1.5, size=10_000) - 5
+
+    sketch = QuantileSketch(0.01).update(values)
+
+    assert sketch.count == len(values)
+    for q in [0.0, 0.25, 0.5, 0.75, 1.0]:
+        expected = np.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_merge_pass_when_merged_sketches_of_parts_equal_sketch_of_all_values():
+    values = np.random.default_rng(42).normal(size=1_000)
+
+    sketch = QuantileSketch(0.01).update(values[:300]).merge(QuantileSketch(0.01).update(values[300:]))
+
+    assert sketch.to_dict() == QuantileSketch(0.01).update(values).to_dict()
+
+
+def test_merge_fail_when_sketches_have_different_relative_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_from_dict_pass_when_restores_sketch_from_its_dict():
+    sketch = QuantileSketch(0.01).update([-2.5, 0, 0, 1, 3, np.nan])
+
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+
+    assert restored.count == 5
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
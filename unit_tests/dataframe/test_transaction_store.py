@@ -0,0 +1,36 @@
+import pytest
+
+from src.dataframe.preprocess import do_prepare_dataframe
+from src.dataframe.transaction_store import build_transaction_store, transactions_within
+
+
+@pytest.mark.parametrize("filter", ["all", "country", "rejected_country"])
+def test_transactions_within_pass_when_returns_same_baskets_as_grouped_filtered_rows(filter):
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    uk_code = code_by_country["United Kingdom"]
+    country_code, reject_country_code = {
+        "all": (None, None),
+        "country": (uk_code, None),
+        "rejected_country": (None, uk_code),
+    }[filter]
+    store = build_transaction_store(df)
+
+    transactions = transactions_within(store, country_code, reject_country_code)
+
+    if country_code:
+        df = df[df["Country"] == country_code]
+    if reject_country_code:
+        df = df[df["Country"] != reject_country_code]
+    grouped = df.groupby("Invoice ID", observed=True).agg({"Stock Code": sorted, "Total Cost": "sum"})
+    baskets, items = transactions["baskets"], transactions["items"]
+    baskets_items = [
+        sorted(items[baskets.indices[start:stop]].repeat(baskets.data[start:stop]).tolist())
+        for start, stop in zip(baskets.indptr, baskets.indptr[1:])
+    ]
+    assert sorted(zip(baskets_items, transactions["total_costs"].tolist())) == sorted(
+        zip(grouped["Stock Code"], grouped["Total Cost"])
+    )
+    assert (
+        transactions["description_by_stock_code"].to_dict()
+        == df.groupby("Stock Code", observed=True)["Stock Description"].first().to_dict()
+    )
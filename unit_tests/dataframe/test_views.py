@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pandas as pd
+
+from src.dataframe.preprocess import do_prepare_dataframe
+from src.dataframe.views import (
+    cached_table,
+    cached_view,
+    filter_by_country_code,
+    filter_by_date_range,
+    versioned_dataset,
+    view_key,
+)
+from unit_tests.conftest import build_dataframe
+
+
+def test_cached_view_pass_when_returns_same_view_for_same_dataset_version_and_filter():
+    df = versioned_dataset(build_dataframe(10), "1")
+
+    view = cached_view(df, "_quantity_", lambda df: df[df["Quantity"] > 1])
+    cached = cached_view(df, "_quantity_", lambda df: df[df["Quantity"] > 1])
+
+    assert cached is view
+    assert view_key(view) == "dataset1__quantity_"
+
+
+def test_cached_view_pass_when_filters_again_for_another_dataset_version():
+    view = cached_view(versioned_dataset(build_dataframe(10), "1"), "_quantity_", lambda df: df)
+    other_view = cached_view(versioned_dataset(build_dataframe(10), "2"), "_quantity_", lambda df: df)
+
+    assert other_view is not view
+    assert view_key(other_view) == "dataset2__quantity_"
+
+
+def test_cached_table_pass_when_calculates_table_of_not_versioned_dataframe_on_each_call():
+    df = build_dataframe(10)
+
+    table = cached_table(df, "_length_", lambda df: [len(df)])
+    other_table = cached_table(df, "_length_", lambda df: [len(df)])
+
+    assert view_key(df) is None
+    assert other_table is not table
+    assert other_table == table
+
+
+def test_cached_table_pass_when_concurrent_calls_share_one_calculation():
+    df = versioned_dataset(build_dataframe(10), "concurrent")
+    calls = []
+
+    def table_fun(df):
+        calls.append(1)
+        time.sleep(0.2)
+        return [len(df)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        tables = list(executor.map(lambda _: cached_table(df, "_length_", table_fun), range(4)))
+
+    assert calls == [1]
+    assert all(table is tables[0] for table in tables)
+
+
+def test_filter_by_date_range_pass_when_slices_same_rows_as_comparing_dates():
+    df, _code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    start, end = pd.Timestamp("2009-12-01 09:00:00"), pd.Timestamp("2009-12-01 10:00:00")
+
+    view = filter_by_date_range(df, start, end)
+
+    pd.testing.assert_frame_equal(view, df[(df["Invoice Date"] >= start) & (df["Invoice Date"] <= end)])
+
+
+def test_filter_by_country_code_pass_when_takes_rows_of_date_range_by_country_index():
+    df, code_by_country = do_prepare_dataframe("dataset/online_retail_II_100.csv", cache_path=None)
+    df = versioned_dataset(df, "1")
+    view = filter_by_date_range(df, pd.Timestamp("2009-12-01 09:00:00"), pd.Timestamp("2009-12-01 10:00:00"))
+    uk_code, france_code = code_by_country["United Kingdom"], code_by_country["France"]
+
+    uk_rejected = filter_by_country_code(view, None, uk_code)
+    france = filter_by_country_code(view, france_code, None)
+
+    assert len(france) > 0
+    pd.testing.assert_frame_equal(uk_rejected, view[view["Country"] != uk_code])
+    pd.testing.assert_frame_equal(france, view[view["Country"] == france_code])
@@ -0,0 +1,44 @@
+import threading
+
+from src.background_jobs import submit_job
+
+
+def test_submit_job_pass_when_runs_job_once_per_key():
+    calls = []
+    started = threading.Event()
+
+    def job():
+        calls.append(1)
+        started.wait(5)
+        return "result"
+
+    first = submit_job("test_submit_job_once", job)
+    second = submit_job("test_submit_job_once", job)
+    started.set()
+
+    assert first is second
+    assert first.result(timeout=5) == "result"
+    assert submit_job("test_submit_job_once", job).result() == "result"
+    assert calls == [1]
+
+
+def test_submit_job_pass_when_submits_failed_job_again():
+    def failed_job():
+        raise ValueError("failed")
+
+    future = submit_job("test_submit_job_error", failed_job)
+
+    assert isinstance(future.exception(timeout=5), ValueError)
+    assert submit_job("test_submit_job_error", lambda: "result").result(timeout=5) == "result"
+
+
+def test_submit_job_pass_when_submits_finished_job_again_on_request():
+    calls = []
+
+    def job():
+        calls.append(1)
+        return len(calls)
+
+    assert submit_job("test_submit_job_resubmit", job).result(timeout=5) == 1
+    assert submit_job("test_submit_job_resubmit", job).result(timeout=5) == 1
+    assert submit_job("test_submit_job_resubmit", job, resubmit_finished=True).result(timeout=5) == 2
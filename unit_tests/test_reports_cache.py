@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+from src.reports_cache import ReportsCache, _report_file_name, persist_report, read_persisted_report
+
+
+def test_read_persisted_report_pass_when_returns_persisted_html_by_key(tmp_path):
+    report_key = "data_exploration__date2010-11-01_2010-12-31_dataset3_0123_"
+
+    assert read_persisted_report(report_key, tmp_path) is None
+
+    persist_report(report_key, "<html>report</html>", tmp_path)
+
+    assert read_persisted_report(report_key, tmp_path) == "<html>report</html>"
+    assert read_persisted_report(report_key + "_country1_", tmp_path) is None
+
+
+def test_persist_report_pass_when_prunes_expired_and_least_recently_used_reports(tmp_path):
+    now = time.time()
+    for report_key, used_seconds_ago in [("previous_dataset_version", 120), ("b", 30), ("c", 20)]:
+        persist_report(report_key, report_key[0] * 100, tmp_path)
+        used_at = now - used_seconds_ago
+        os.utime(_report_file_name(tmp_path, report_key), (used_at, used_at))
+
+    persist_report("d", "d" * 100, tmp_path, max_bytes=250, ttl_seconds=60)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(_report_file_name(tmp_path, report_key)) for report_key in ["c", "d"]
+    )
+
+
+def test_reports_cache_pass_when_evicts_least_recently_used_reports_beyond_memory_budget():
+    report_size = sys.getsizeof("a" * 1000)
+    cache = ReportsCache(max_bytes=report_size * 2, ttl_seconds=60)
+
+    cache.get("a", lambda: "a" * 1000)
+    cache.get("b", lambda: "b" * 1000)
+    assert cache.get("a", lambda: "generated again") == "a" * 1000
+    cache.get("c", lambda: "c" * 1000)
+
+    assert cache.contains("a")
+    assert not cache.contains("b")
+    assert cache.contains("c")
+    assert cache.size_bytes == report_size * 2
+    assert cache.counters == {"hits": 1, "disk_hits": 0, "misses": 3, "evictions": 1}
+
+
+def test_reports_cache_pass_when_generates_expired_report_again():
+    cache = ReportsCache(max_bytes=1024**2, ttl_seconds=0)
+
+    cache.get("a", lambda: "report")
+
+    assert not cache.contains("a")
+    assert cache.get("a", lambda: "generated again") == "generated again"
+    assert cache.counters == {"hits": 0, "disk_hits": 0, "misses": 2, "evictions": 1}
+
+
+def test_reports_cache_pass_when_reads_evicted_report_from_disk(tmp_path):
+    cache = ReportsCache(max_bytes=1024**2, ttl_seconds=0, path=tmp_path)
+
+    cache.get("a", lambda: "<html>report</html>")
+
+    assert cache.contains("a")
+    assert cache.get("a", lambda: "generated again") == "<html>report</html>"
+    assert cache.counters["disk_hits"] == 1
+    assert ReportsCache(max_bytes=1024**2, ttl_seconds=60, path=tmp_path).get("a", lambda: None) == (
+        "<html>report</html>"
+    )
+
+
+def test_reports_cache_pass_when_concurrent_retrievals_share_one_generation():
+    cache = ReportsCache(max_bytes=1024**2, ttl_seconds=60)
+    calls = []
+
+    def generator_fun():
+        calls.append(1)
+        time.sleep(0.2)
+        return "report"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        reports = list(executor.map(lambda _: cache.get("a", generator_fun), range(4)))
+
+    assert calls == [1]
+    assert reports == ["report"] * 4
+    assert cache.counters["misses"] == 1
+
+
+def test_reports_cache_pass_when_finds_cached_reports_without_generation(tmp_path):
+    cache = ReportsCache(max_bytes=1024**2, ttl_seconds=0, path=tmp_path)
+
+    assert cache.find("a") is None
+    cache.get("a", lambda: "<html>report</html>")
+
+    assert cache.find("a") == "<html>report</html>"
+    assert cache.counters == {"hits": 0, "disk_hits": 1, "misses": 1, "evictions": 1}
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from src.single_flight import SingleFlight
+
+
+def test_single_flight_pass_when_concurrent_calls_share_one_call():
+    single_flight = SingleFlight()
+    calls = []
+
+    def fun():
+        calls.append(1)
+        time.sleep(0.2)
+        return ["result"]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: single_flight.do("key", fun), range(4)))
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert single_flight.do("key", lambda: ["called again"]) == ["called again"]
+
+
+def test_single_flight_pass_when_waiting_calls_raise_error_of_in_flight_call():
+    single_flight = SingleFlight()
+    started = threading.Event()
+
+    def fun():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("failed")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        in_flight = executor.submit(single_flight.do, "key", fun)
+        started.wait(5)
+
+        with pytest.raises(ValueError, match="failed"):
+            single_flight.do("key", lambda: "not called")
+
+        with pytest.raises(ValueError, match="failed"):
+            in_flight.result()
+
+
+def test_single_flight_pass_when_waiting_call_calls_again_after_interrupted_call():
+    single_flight = SingleFlight()
+    started = threading.Event()
+
+    def interrupted_fun():
+        started.set()
+        time.sleep(0.2)
+        raise KeyboardInterrupt()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        in_flight = executor.submit(single_flight.do, "key", interrupted_fun)
+        started.wait(5)
+
+        assert single_flight.do("key", lambda: "called again") == "called again"
+        with pytest.raises(KeyboardInterrupt):
+            in_flight.result()